@@ -0,0 +1,106 @@
+"""
+Compare /inventory/audit before and after the shared balances reader.
+
+Seeds gold_ledger, ml_ledger and potion_ledger with ROWS rows each and then
+times the old six-query audit against ledger.get_balances, counting the
+database round-trips each one makes.
+
+This TRUNCATEs the ledgers, so it only runs against BENCH_POSTGRES_URI and
+never against POSTGRES_URI. Apply the migrations there first with
+`python -m src.migrate --database-url $BENCH_POSTGRES_URI`.
+
+    BENCH_POSTGRES_URI=postgresql+psycopg2://... python -m benchmarks.audit_benchmark
+"""
+import os
+import statistics
+import sys
+import time
+
+import sqlalchemy
+
+from src import ledger
+
+ROWS = int(os.environ.get("BENCH_ROWS", 1_000_000))
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", 20))
+
+OLD_AUDIT_SQL = [
+    "SELECT SUM(quantity_change) as gold from gold_ledger",
+    "SELECT SUM(quantity_change) as potions from potion_ledger",
+    "SELECT SUM(red_change) as red from ml_ledger",
+    "SELECT SUM(green_change) as green from ml_ledger",
+    "SELECT SUM(blue_change) as blue from ml_ledger",
+    "SELECT SUM(dark_change) as dark from ml_ledger",
+]
+
+
+def seed(engine):
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text("TRUNCATE TABLE gold_ledger"))
+        connection.execute(sqlalchemy.text("TRUNCATE TABLE ml_ledger"))
+        connection.execute(sqlalchemy.text("TRUNCATE TABLE potion_ledger"))
+        connection.execute(sqlalchemy.text(
+            "INSERT INTO gold_ledger (quantity_change) SELECT (i % 7) - 3 FROM generate_series(1, :rows) i"
+        ), {"rows": ROWS})
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO ml_ledger (red_change, green_change, blue_change, dark_change)
+            SELECT i % 100, i % 50, -(i % 25), i % 10 FROM generate_series(1, :rows) i
+        """), {"rows": ROWS})
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO potion_ledger (potion_id, quantity_change)
+            SELECT (SELECT id FROM potions ORDER BY id LIMIT 1), (i % 5) - 2 FROM generate_series(1, :rows) i
+        """), {"rows": ROWS})
+
+
+def old_audit(connection):
+    results = [connection.execute(sqlalchemy.text(sql)).scalar() or 0 for sql in OLD_AUDIT_SQL]
+    gold, potions = results[0], results[1]
+    return {"number_of_potions": potions, "ml_in_barrels": sum(results[2:]), "gold": gold}
+
+
+def new_audit(connection):
+    balances = ledger.get_balances(connection)
+    return {
+        "number_of_potions": balances["potions"],
+        "ml_in_barrels": sum(balances["ml"].values()),
+        "gold": balances["gold"],
+    }
+
+
+def measure(engine, audit, statements):
+    timings = []
+    result = None
+    for _ in range(ITERATIONS):
+        statements.clear()
+        start = time.perf_counter()
+        with engine.connect() as connection:
+            result = audit(connection)
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, timings, len(statements)
+
+
+def main():
+    url = os.environ.get("BENCH_POSTGRES_URI")
+    if not url:
+        sys.exit("BENCH_POSTGRES_URI is not set")
+
+    engine = sqlalchemy.create_engine(url)
+    statements = []
+    sqlalchemy.event.listen(
+        engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+    )
+
+    print(f"seeding {ROWS} rows per ledger...")
+    seed(engine)
+
+    for name, audit in (("six SUM queries", old_audit), ("get_balances", new_audit)):
+        result, timings, round_trips = measure(engine, audit, statements)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(
+            f"{name:>16}: median {statistics.median(timings):8.2f} ms  "
+            f"p95 {p95:8.2f} ms  round-trips {round_trips}  -> {result}"
+        )
+
+
+if __name__ == "__main__":
+    main()
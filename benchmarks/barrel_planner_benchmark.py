@@ -0,0 +1,98 @@
+"""
+Compare the barrel purchase planners on random wholesale catalogs.
+
+Reports ml bought, gold spent, ml per gold and planning time for each
+planner across catalog sizes. knapsack gets a random per-color demand, as
+sales.color_weights() would give it. No database is needed.
+
+Catalogs come from --seed, so every run plans the same inputs. Timings
+still depend on the machine, so the header prints what they were taken on;
+compare numbers from the same machine only.
+
+    python -m benchmarks.barrel_planner_benchmark
+    python -m benchmarks.barrel_planner_benchmark --sizes 5000 --trials 100
+"""
+import argparse
+import os
+import platform
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.planners import barrels
+
+SIZES = [8, 100, 1000, 5000]
+TRIALS = 20
+SIZES_ML = [200, 500, 2500, 10000]
+BASE_PRICE_PER_ML = {200: 0.30, 500: 0.20, 2500: 0.10, 10000: 0.075}
+
+
+def random_catalog(rng, size):
+    catalog = []
+    for i in range(size):
+        ml = rng.choice(SIZES_ML)
+        color = rng.randrange(4)
+        potion_type = [0, 0, 0, 0]
+        potion_type[color] = 1
+        price = max(1, int(ml * BASE_PRICE_PER_ML[ml] * rng.uniform(0.8, 1.4)))
+        catalog.append(SimpleNamespace(
+            sku=f"BARREL_{i}", ml_per_barrel=ml, potion_type=potion_type,
+            price=price, quantity=rng.randint(1, 30),
+        ))
+    return catalog
+
+
+def run_planner(strategy, catalog, gold, current_ml, max_allowed_ml, demand):
+    start = time.perf_counter()
+    plan = barrels.plan(strategy, catalog, gold, current_ml, max_allowed_ml, demand)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    by_sku = {barrel.sku: barrel for barrel in catalog}
+    spent = sum(by_sku[sku].price * quantity for sku, quantity in plan)
+    ml = sum(by_sku[sku].ml_per_barrel * quantity for sku, quantity in plan)
+    assert spent <= gold, "plan overspends"
+    assert ml + sum(current_ml.values()) <= max_allowed_ml, "plan exceeds ml capacity"
+    assert all(quantity <= by_sku[sku].quantity for sku, quantity in plan), "plan exceeds catalog quantity"
+    return {"ml": ml, "gold": spent, "ml_per_gold": ml / spent if spent else 0.0, "ms": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the barrel purchase planners.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--trials", type=int, default=TRIALS)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    machine = " ".join(filter(None, [platform.machine(), platform.processor()]))
+    print(f"python {platform.python_version()}, numpy {np.__version__}, {machine}, {os.cpu_count()} cpus, seed {args.seed}")
+    rng = random.Random(args.seed)
+    # warm up so the first timed run does not pay for importing numpy
+    barrels.plan_knapsack(random_catalog(rng, 4), 100, dict.fromkeys(barrels.COLORS, 0), 10000)
+
+    for size in args.sizes:
+        results = {strategy: [] for strategy in barrels.Strategy}
+        for _ in range(args.trials):
+            catalog = random_catalog(rng, size)
+            max_allowed_ml = rng.randint(1, 10) * 10000
+            current_ml = {color: rng.randint(0, max_allowed_ml // 8) for color in barrels.COLORS}
+            gold = rng.randint(100, 20000)
+            demand = {color: rng.randint(1, 100) for color in barrels.COLORS}
+            for strategy in barrels.Strategy:
+                results[strategy].append(run_planner(strategy, catalog, gold, current_ml, max_allowed_ml, demand))
+
+        print(f"{size} skus, mean of {args.trials} trials")
+        for strategy, runs in results.items():
+            print(
+                f"  {strategy.value:>9}: ml {statistics.mean(r['ml'] for r in runs):9.0f}  "
+                f"gold {statistics.mean(r['gold'] for r in runs):8.0f}  "
+                f"ml/gold {statistics.mean(r['ml_per_gold'] for r in runs):6.2f}  "
+                f"time {statistics.mean(r['ms'] for r in runs):7.3f} ms  "
+                f"(max {max(r['ms'] for r in runs):.3f} ms)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare the bottling planners on random recipe books.
+
+For each size, generates recipes that sum to 100 ml, a random ml inventory,
+prices and sales weights. Every strategy plans the same inputs and is
+scored on the same objectives: potions bottled (what max_count aims for),
+revenue (max_revenue), sales-weighted potions, the sum of each potion's
+sales weight times its count (best_sellers), plus ml left unused and
+planning time. No database is needed.
+
+    python -m benchmarks.bottle_planner_benchmark
+"""
+import random
+import statistics
+import time
+
+from src.planners import bottling
+
+SIZES = [6, 50, 200, 500]
+TRIALS = 20
+
+
+def random_recipe(rng):
+    cuts = sorted(rng.randint(0, 100) for _ in range(3))
+    return [cuts[0], cuts[1] - cuts[0], cuts[2] - cuts[1], 100 - cuts[2]]
+
+
+def run_planner(strategy, inventory, recipes, max_potions, prices, sales_weights):
+    start = time.perf_counter()
+    counts = bottling.plan(strategy, inventory, recipes, max_potions, prices, sales_weights)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    used = [sum(recipes[potion_id][i] * count for potion_id, count in counts.items()) for i in range(4)]
+    assert all(used[i] <= inventory[i] for i in range(4)), "plan exceeds ml inventory"
+    return {
+        "potions": sum(counts.values()),
+        "revenue": sum(prices[potion_id] * count for potion_id, count in counts.items()),
+        "weighted": sum(sales_weights[potion_id] * count for potion_id, count in counts.items()),
+        "unused_ml": sum(inventory) - sum(used),
+        "ms": elapsed,
+    }
+
+
+def main():
+    rng = random.Random(42)
+    # warm up so the first timed run does not pay for importing numpy
+    bottling.plan_greedy([100, 0, 0, 0], {0: [100, 0, 0, 0]}, 1)
+
+    for size in SIZES:
+        results = {strategy: [] for strategy in bottling.Strategy}
+        for _ in range(TRIALS):
+            recipes = {potion_id: random_recipe(rng) for potion_id in range(size)}
+            prices = {potion_id: rng.randint(20, 80) for potion_id in recipes}
+            # units sold + 1, as sales.potion_weights() gives them; most potions sell little
+            sales_weights = {potion_id: int(rng.paretovariate(1.5)) for potion_id in recipes}
+            inventory = [rng.randint(0, 20000) for _ in range(4)]
+            max_potions = rng.randint(50, 500)
+            for strategy in bottling.Strategy:
+                results[strategy].append(
+                    run_planner(strategy, inventory, recipes, max_potions, prices, sales_weights)
+                )
+
+        print(f"{size} recipes, mean of {TRIALS} trials")
+        for strategy, runs in results.items():
+            print(
+                f"  {strategy.value:>12}: potions {statistics.mean(r['potions'] for r in runs):8.1f}  "
+                f"revenue {statistics.mean(r['revenue'] for r in runs):9.1f}  "
+                f"sales-weighted {statistics.mean(r['weighted'] for r in runs):8.1f}  "
+                f"unused ml {statistics.mean(r['unused_ml'] for r in runs):9.1f}  "
+                f"time {statistics.mean(r['ms'] for r in runs):7.3f} ms  "
+                f"(max {max(r['ms'] for r in runs):.3f} ms)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Hammer checkout for a single SKU from many workers at once.
+
+Each round stocks one potion with enough for half of the carts, then checks
+out every cart concurrently through ledger_writer.run, the path the
+checkout endpoint takes (LEDGER_WRITER picks direct or group commit). It
+reports checkouts/sec per worker count and the speedup over one worker, and
+fails if stock ever goes negative or if the ledger disagrees with the number
+of successful checkouts.
+
+Scaling has a ceiling. Every checkout's gold entry updates the single
+ledger_balances row through its trigger and holds it until commit, so
+concurrent checkouts commit one at a time whatever the potion. Checkout
+writes gold last to keep that window short, but in direct mode throughput
+still flattens once commits queue on that row; group mode takes the lock
+once per group, which is what lets it keep scaling.
+
+This writes carts and ledger rows, so it only runs against
+BENCH_POSTGRES_URI. Apply the migrations there first with
+`python -m src.migrate --database-url $BENCH_POSTGRES_URI`.
+
+    BENCH_POSTGRES_URI=postgresql+psycopg2://... python -m benchmarks.checkout_concurrency
+    BENCH_POSTGRES_URI=postgresql+psycopg2://... LEDGER_WRITER=group python -m benchmarks.checkout_concurrency
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy
+
+BENCH_URL = os.environ.get("BENCH_POSTGRES_URI")
+if not BENCH_URL:
+    sys.exit("BENCH_POSTGRES_URI is not set")
+WORKER_COUNTS = [1, 4, 16, 64]
+
+# the checkouts run on the server's engine, pointed at the bench database
+# and sized so every worker gets a connection
+os.environ["POSTGRES_URI"] = BENCH_URL
+os.environ["DB_POOL_SIZE"] = str(max(WORKER_COUNTS))
+os.environ["DB_MAX_OVERFLOW"] = "0"
+
+from fastapi import HTTPException  # noqa: E402
+
+from src import database as db  # noqa: E402
+from src import ledger_writer  # noqa: E402
+from src.api import carts  # noqa: E402
+
+CARTS = int(os.environ.get("BENCH_CARTS", 2000))
+QUANTITY = 2
+SKU = "BENCH_CHECKOUT_POTION"
+
+
+def setup_round(engine):
+    """Stock the bench potion for half the carts and create the carts. Returns (potion_id, cart_ids)."""
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO potions (sku, name, price, red, green, blue, dark)
+            VALUES (:sku, 'bench potion', 10, 0, 0, 0, 100)
+            ON CONFLICT (sku) DO NOTHING
+        """), {"sku": SKU})
+        potion_id = connection.execute(sqlalchemy.text("SELECT id FROM potions WHERE sku = :sku"), {"sku": SKU}).scalar()
+
+        stock = connection.execute(
+            sqlalchemy.text("SELECT COALESCE((SELECT quantity FROM potion_balances WHERE potion_id = :id), 0)"),
+            {"id": potion_id}
+        ).scalar()
+        connection.execute(
+            sqlalchemy.text("INSERT INTO potion_ledger (potion_id, quantity_change) VALUES (:id, :change)"),
+            {"id": potion_id, "change": CARTS * QUANTITY // 2 - stock}
+        )
+
+        cart_ids = connection.execute(sqlalchemy.text("""
+            INSERT INTO carts (customer_name, character_class, level)
+            SELECT 'bench ' || i, 'Bench', 1 FROM generate_series(1, :carts) i
+            RETURNING id
+        """), {"carts": CARTS}).scalars().all()
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO cart_items (cart_id, item_sku, quantity, potion_id, cost)
+            SELECT id, :sku, :quantity, :potion_id, :quantity * 10 FROM unnest(CAST(:cart_ids AS bigint[])) id
+        """), {"sku": SKU, "quantity": QUANTITY, "potion_id": potion_id, "cart_ids": cart_ids})
+
+    # the bench potion may be new to this process
+    carts.recipes.invalidate()
+    return potion_id, cart_ids
+
+
+def checkout(cart_id):
+    try:
+        ledger_writer.run(carts._checkout, cart_id, carts.CartCheckout(payment="bench"))
+        return True
+    except HTTPException as e:
+        if e.status_code != 409:
+            raise
+        return False
+
+
+def stock_of(engine, potion_id):
+    with engine.connect() as connection:
+        return connection.execute(
+            sqlalchemy.text("SELECT quantity FROM potion_balances WHERE potion_id = :id"), {"id": potion_id}
+        ).scalar()
+
+
+def main():
+    engine = db.get_engine()
+    print(f"LEDGER_WRITER={ledger_writer.MODE}")
+    baseline = None
+    for workers in WORKER_COUNTS:
+        potion_id, cart_ids = setup_round(engine)
+        starting_stock = stock_of(engine, potion_id)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(checkout, cart_ids))
+            elapsed = time.perf_counter() - start
+
+        succeeded = sum(results)
+        final_stock = stock_of(engine, potion_id)
+        throughput = len(cart_ids) / elapsed
+        baseline = baseline or throughput
+        print(
+            f"{workers:>3} workers: {throughput:8.1f} checkouts/s  x{throughput / baseline:4.1f}  "
+            f"succeeded {succeeded}  rejected {len(results) - succeeded}  stock {starting_stock} -> {final_stock}"
+        )
+        assert final_stock >= 0, "inventory went negative"
+        assert starting_stock - final_stock == succeeded * QUANTITY, "ledger disagrees with successful checkouts"
+
+
+if __name__ == "__main__":
+    main()
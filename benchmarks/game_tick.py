@@ -0,0 +1,188 @@
+"""
+Drive the full game tick against a running server and report per-endpoint
+throughput and latency percentiles.
+
+Each tick does what the game does: plan and take a barrel delivery, plan and
+take a bottle delivery, read the catalog, serve a few customers (create
+cart, add items, check out), and search orders. CONCURRENCY ticks run at
+once until TICKS have finished.
+
+Seed the benchmark database first, then either point this at a server
+already running on it, or let it start one with --serve:
+
+    BENCH_POSTGRES_URI=postgresql+psycopg2://... python -m benchmarks.seed --rows 1000000
+    BENCH_POSTGRES_URI=postgresql+psycopg2://... python -m benchmarks.game_tick --serve --concurrency 32
+
+To measure the handlers and planners without database I/O, serve the shop
+from memory instead (it starts empty, with 100 gold):
+
+    STORAGE_BACKEND=memory python -m benchmarks.game_tick --serve --concurrency 32
+
+Checkouts rejected with 409 for lack of stock are counted separately and
+not as errors.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.load_test import percentile
+
+COLORS = ("red", "green", "blue", "dark")
+BARREL_SIZES = [("SMALL", 500, 100), ("MEDIUM", 2500, 250), ("LARGE", 10000, 400)]
+CUSTOMERS_PER_TICK = 3
+
+WHOLESALE_CATALOG = [
+    {
+        "sku": f"{size}_{color.upper()}_BARREL",
+        "ml_per_barrel": ml,
+        "potion_type": [1 if index == color_index else 0 for index in range(4)],
+        "price": price,
+        "quantity": 10,
+    }
+    for color_index, color in enumerate(COLORS)
+    for size, ml, price in BARREL_SIZES
+]
+
+_order_ids = itertools.count(int(time.time() * 1000))
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.rejected = 0
+
+    async def call(self, client, name, method, path, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, path, **kwargs)
+        self.latencies.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+        if response.status_code == 409 and name.endswith("/checkout"):
+            self.rejected += 1
+        elif response.status_code >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+
+async def tick(client, recorder, rng):
+    # buy barrels
+    plan = (await recorder.call(client, "POST /barrels/plan", "POST", "/barrels/plan", json=WHOLESALE_CATALOG)).json()
+    quantities = {purchase["sku"]: purchase["quantity"] for purchase in plan} if isinstance(plan, list) else {}
+    delivered = [dict(barrel, quantity=quantities[barrel["sku"]]) for barrel in WHOLESALE_CATALOG if barrel["sku"] in quantities]
+    await recorder.call(
+        client, "POST /barrels/deliver/{order_id}", "POST", f"/barrels/deliver/{next(_order_ids)}", json=delivered
+    )
+
+    # bottle
+    bottles = (await recorder.call(client, "POST /bottler/plan", "POST", "/bottler/plan")).json()
+    await recorder.call(
+        client, "POST /bottler/deliver/{order_id}", "POST", f"/bottler/deliver/{next(_order_ids)}",
+        json=bottles if isinstance(bottles, list) else []
+    )
+
+    # sell
+    catalog = (await recorder.call(client, "GET /catalog/", "GET", "/catalog/")).json()
+    for _ in range(CUSTOMERS_PER_TICK):
+        if not catalog:
+            break
+        customer = {
+            "customer_name": f"customer {rng.randrange(50000)}",
+            "character_class": rng.choice(["Warrior", "Rogue", "Wizard", "Cleric"]),
+            "level": rng.randint(1, 20),
+        }
+        cart = (await recorder.call(client, "POST /carts/", "POST", "/carts/", json=customer)).json()
+        cart_id = cart.get("cart_id")
+        if cart_id is None:
+            continue
+        for item in rng.sample(catalog, min(2, len(catalog))):
+            await recorder.call(
+                client, "POST /carts/{cart_id}/items/{item_sku}", "POST", f"/carts/{cart_id}/items/{item['sku']}",
+                json={"quantity": 1}
+            )
+        await recorder.call(
+            client, "POST /carts/{cart_id}/checkout", "POST", f"/carts/{cart_id}/checkout", json={"payment": "gold"}
+        )
+
+    # search
+    await recorder.call(
+        client, "GET /carts/search/", "GET", "/carts/search/",
+        params={"customer_name": f"customer {rng.randrange(1000)}", "sort_col": "timestamp"}
+    )
+
+
+async def run(url, concurrency, ticks, api_key):
+    recorder = Recorder()
+    remaining = ticks
+
+    async def worker(client, seed):
+        nonlocal remaining
+        rng = random.Random(seed)
+        while remaining > 0:
+            remaining -= 1
+            await tick(client, recorder, rng)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"access_token": api_key} if api_key else {}
+    async with httpx.AsyncClient(base_url=url, limits=limits, headers=headers, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, seed) for seed in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    print(f"{ticks} ticks in {elapsed:.1f} s ({ticks / elapsed:.1f} ticks/s), {recorder.rejected} checkouts out of stock")
+    print(f"{'endpoint':<40} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, latencies in recorder.latencies.items():
+        latencies.sort()
+        print(
+            f"{name:<40} {len(latencies) / elapsed:9.1f} {percentile(latencies, 0.50):9.2f} "
+            f"{percentile(latencies, 0.95):9.2f} {percentile(latencies, 0.99):9.2f} {recorder.errors.get(name, 0):>7}"
+        )
+
+
+def serve(port):
+    """Start a server on the benchmark database (or in memory) and wait until it answers."""
+    env = dict(os.environ)
+    if env.get("STORAGE_BACKEND") != "memory":
+        url = env.get("BENCH_POSTGRES_URI")
+        if not url:
+            sys.exit("BENCH_POSTGRES_URI is not set")
+        env["POSTGRES_URI"] = url
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api.server:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    sys.exit("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the full game tick concurrently against the shop.")
+    parser.add_argument("--url", default="http://127.0.0.1:3000")
+    parser.add_argument("--serve", action="store_true", help="start a server on BENCH_POSTGRES_URI (or in memory) at --url's port")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--ticks", type=int, default=500)
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY"))
+    args = parser.parse_args()
+
+    server = serve(httpx.URL(args.url).port or 80) if args.serve else None
+    try:
+        asyncio.run(run(args.url, args.concurrency, args.ticks, args.api_key))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
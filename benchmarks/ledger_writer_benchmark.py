@@ -0,0 +1,61 @@
+"""
+Ledger write throughput: one commit per request against group commit.
+
+Many threads each run small ledger units (a gold and an ml row, the shape of
+a barrel delivery) through ledger_writer, once per mode, and the script
+reports units/sec and how many units each group commit carried.
+
+This writes ledger rows, so it only runs against BENCH_POSTGRES_URI with
+the migrations applied:
+
+    BENCH_POSTGRES_URI=postgresql+psycopg2://... python -m benchmarks.ledger_writer_benchmark
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_URL = os.environ.get("BENCH_POSTGRES_URI")
+if not BENCH_URL:
+    sys.exit("BENCH_POSTGRES_URI is not set")
+os.environ["POSTGRES_URI"] = BENCH_URL
+os.environ.setdefault("DB_POOL_SIZE", "64")
+
+from src import ledger_writer  # noqa: E402
+
+THREADS = 64
+UNITS = int(os.environ.get("BENCH_UNITS", 20000))
+MODES = [
+    ("direct", True),
+    ("group", True),
+    ("group", False),
+]
+
+
+def unit(store):
+    store.record_gold(-1)
+    store.record_ml({"red": 1})
+
+
+def main():
+    for mode, synchronous_commit in MODES:
+        ledger_writer.MODE = mode
+        ledger_writer.SYNCHRONOUS_COMMIT = synchronous_commit
+        before = ledger_writer.stats()
+
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            start = time.perf_counter()
+            list(pool.map(lambda _: ledger_writer.run(unit), range(UNITS)))
+            elapsed = time.perf_counter() - start
+
+        after = ledger_writer.stats()
+        groups = after["groups"] - before["groups"]
+        per_group = (after["units"] - before["units"]) / groups if groups else 1
+        label = f"{mode}{'' if synchronous_commit else ' (synchronous_commit off)'}"
+        print(f"{label:<32} {UNITS / elapsed:9.1f} units/s  {per_group:6.1f} units per commit")
+
+    ledger_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
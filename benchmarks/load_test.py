@@ -0,0 +1,78 @@
+"""
+Closed-loop HTTP load test for the read endpoints.
+
+Start the server once normally and once with ASYNC_DB=1, then point this at
+each to compare requests/sec and latency percentiles between the threadpool
+and asyncio paths:
+
+    uvicorn src.api.server:app --port 3000 --workers 1
+    python -m benchmarks.load_test --url http://127.0.0.1:3000 --concurrency 256
+
+    ASYNC_DB=1 uvicorn src.api.server:app --port 3001 --workers 1
+    python -m benchmarks.load_test --url http://127.0.0.1:3001 --concurrency 256
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+ENDPOINTS = ["/catalog/", "/inventory/audit", "/carts/search/"]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+async def run(url, path, concurrency, total, api_key):
+    latencies = []
+    errors = 0
+    remaining = total
+    lock = asyncio.Lock()
+
+    async def worker(client):
+        nonlocal remaining, errors
+        while True:
+            async with lock:
+                if remaining == 0:
+                    return
+                remaining -= 1
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"access_token": api_key} if api_key else {}
+    async with httpx.AsyncClient(base_url=url, limits=limits, headers=headers, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(
+        f"{path:<18} {total / elapsed:9.1f} req/s  "
+        f"p50 {percentile(latencies, 0.50):8.2f} ms  "
+        f"p99 {percentile(latencies, 0.99):8.2f} ms  errors {errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the read endpoints.")
+    parser.add_argument("--url", default="http://127.0.0.1:3000")
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--requests", type=int, default=5000, help="requests per endpoint")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY"))
+    args = parser.parse_args()
+
+    for path in ENDPOINTS:
+        asyncio.run(run(args.url, path, args.concurrency, args.requests, args.api_key))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Seed a benchmark database with a realistic shop.
+
+Applies the migrations, then replaces the shop's contents with a fixed set
+of potion recipes, ROWS ledger rows spread over gold_ledger, ml_ledger and
+potion_ledger, and carts and cart_items in proportion (a tenth of ROWS carts
+with two lines each). Everything is generated server-side with
+generate_series and a fixed random seed, so the same ROWS gives the same
+data every time. Balances end up positive, with enough gold, ml, stock and
+capacity for game_tick.py to run the full tick.
+
+This TRUNCATEs the shop tables, so it only runs against BENCH_POSTGRES_URI:
+
+    BENCH_POSTGRES_URI=postgresql+psycopg2://... python -m benchmarks.seed --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import sqlalchemy
+
+from src import migrate
+
+# (sku, name, price, red, green, blue, dark)
+POTIONS = [
+    ("RED_POTION", "red potion", 50, 100, 0, 0, 0),
+    ("GREEN_POTION", "green potion", 50, 0, 100, 0, 0),
+    ("BLUE_POTION", "blue potion", 50, 0, 0, 100, 0),
+    ("DARK_POTION", "dark potion", 65, 0, 0, 0, 100),
+    ("YELLOW_POTION", "yellow potion", 55, 50, 50, 0, 0),
+    ("PURPLE_POTION", "purple potion", 55, 50, 0, 50, 0),
+    ("TEAL_POTION", "teal potion", 55, 0, 50, 50, 0),
+    ("SHADOW_POTION", "shadow potion", 60, 50, 0, 0, 50),
+    ("MOSS_POTION", "moss potion", 60, 0, 50, 0, 50),
+    ("STORM_POTION", "storm potion", 60, 0, 0, 50, 50),
+    ("RAINBOW_POTION", "rainbow potion", 75, 25, 25, 25, 25),
+    ("EMBER_POTION", "ember potion", 70, 75, 0, 0, 25),
+]
+
+CLASSES = ["Warrior", "Rogue", "Wizard", "Cleric", "Ranger", "Druid", "Monk", "Paladin"]
+
+
+def seed(engine, rows):
+    per_ledger = max(rows // 3, 1)
+    carts = max(rows // 10, 1)
+
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text("SELECT setseed(0.42)"))
+        connection.execute(sqlalchemy.text(
+            "TRUNCATE TABLE gold_ledger, ml_ledger, potion_ledger, cart_items, carts, processed_deliveries, sales_rollups"
+        ))
+
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO potions (sku, name, price, red, green, blue, dark)
+            VALUES (:sku, :name, :price, :red, :green, :blue, :dark)
+            ON CONFLICT (sku) DO UPDATE
+            SET name = EXCLUDED.name, price = EXCLUDED.price
+        """), [
+            dict(zip(("sku", "name", "price", "red", "green", "blue", "dark"), potion)) for potion in POTIONS
+        ])
+        connection.execute(sqlalchemy.text("DELETE FROM capacity"))
+        connection.execute(sqlalchemy.text("INSERT INTO capacity (potion_capacity, ml_capacity) VALUES (10, 10)"))
+
+        # history spread over the last 30 days; changes net out close to zero
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO gold_ledger (created_at, quantity_change)
+            SELECT now() - random() * interval '30 days', (random() * 200)::int - 100
+            FROM generate_series(1, :rows)
+        """), {"rows": per_ledger})
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO ml_ledger (created_at, red_change, green_change, blue_change, dark_change)
+            SELECT now() - random() * interval '30 days',
+                   (random() * 1000)::int - 500, (random() * 1000)::int - 500,
+                   (random() * 1000)::int - 500, (random() * 1000)::int - 500
+            FROM generate_series(1, :rows)
+        """), {"rows": per_ledger})
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO potion_ledger (created_at, potion_id, quantity_change)
+            SELECT now() - random() * interval '30 days', potion_ids[1 + (i % array_length(potion_ids, 1))],
+                   (random() * 10)::int - 5
+            FROM generate_series(1, :rows) i,
+                 (SELECT array_agg(id ORDER BY id) AS potion_ids FROM potions) p
+        """), {"rows": per_ledger})
+
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO carts (created_at, customer_name, character_class, level)
+            SELECT now() - random() * interval '30 days', 'customer ' || (i % 50000),
+                   (CAST(:classes AS text[]))[1 + (i % :class_count)], 1 + (i % 20)
+            FROM generate_series(1, :carts) i
+        """), {"carts": carts, "classes": CLASSES, "class_count": len(CLASSES)})
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO cart_items (created_at, cart_id, potion_id, item_sku, quantity, cost)
+            SELECT c.created_at, c.id, p.ids[pick.k], p.skus[pick.k], pick.quantity, pick.quantity * p.prices[pick.k]
+            FROM carts c
+            CROSS JOIN generate_series(0, 1) line
+            CROSS JOIN (
+                SELECT array_agg(id ORDER BY id) AS ids, array_agg(sku ORDER BY id) AS skus,
+                       array_agg(price ORDER BY id) AS prices
+                FROM potions
+            ) p
+            CROSS JOIN LATERAL (
+                SELECT 1 + ((c.id + line * 7) % array_length(p.ids, 1))::int AS k, 1 + (random() * 4)::int AS quantity
+            ) pick
+        """))
+
+        # top the balances up so every step of the tick has something to work with
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO gold_ledger (quantity_change)
+            SELECT 1000000 - gold FROM ledger_balances WHERE id = 1
+        """))
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO ml_ledger (red_change, green_change, blue_change, dark_change)
+            SELECT 20000 - red_ml, 20000 - green_ml, 20000 - blue_ml, 20000 - dark_ml
+            FROM ledger_balances WHERE id = 1
+        """))
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO potion_ledger (potion_id, quantity_change)
+            SELECT p.id, 20 - COALESCE(pb.quantity, 0)
+            FROM potions p
+            LEFT JOIN potion_balances pb ON pb.potion_id = p.id
+        """))
+
+    with engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").execute(sqlalchemy.text("ANALYZE"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the benchmark database.")
+    parser.add_argument("--rows", type=int, default=int(os.environ.get("BENCH_ROWS", 100_000)),
+                        help="ledger rows in total, 10k to 10M")
+    args = parser.parse_args()
+
+    url = os.environ.get("BENCH_POSTGRES_URI")
+    if not url:
+        sys.exit("BENCH_POSTGRES_URI is not set")
+
+    engine = sqlalchemy.create_engine(url)
+    migrate.migrate(engine)
+    start = time.perf_counter()
+    seed(engine, args.rows)
+    print(f"seeded {args.rows} ledger rows and {max(args.rows // 10, 1)} carts in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Response serialization cost per response size.
+
+Builds catalog, search and bottle plan payloads of increasing size and times
+the ways a handler result can become a response body:
+
+    validated    response_model validation, jsonable_encoder, then JSONResponse
+    default      jsonable_encoder then JSONResponse (a plain dict return)
+    orjson       ORJSONResponse of the dict, which the hot endpoints now return
+    precomputed  a Response over bytes serialized once (the cached catalog)
+
+No database is needed:
+
+    python -m benchmarks.serialization_benchmark
+"""
+import time
+from datetime import datetime
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel, parse_obj_as
+
+SIZES = [10, 100, 1000, 10000]
+MIN_SECONDS = 0.2
+
+
+class CatalogItem(BaseModel):
+    sku: str
+    name: str
+    quantity: int
+    price: int
+    potion_type: list[int]
+
+
+class SearchResult(BaseModel):
+    cart_id: int
+    item_sku: str
+    customer_name: str
+    line_item_total: int
+    timestamp: str
+
+
+class SearchPage(BaseModel):
+    previous: str
+    next: str
+    results: list[SearchResult]
+
+
+class PotionInventory(BaseModel):
+    potion_type: list[int]
+    quantity: int
+
+
+def catalog(size):
+    return [
+        {"sku": f"POTION_{i}", "name": f"potion {i}", "quantity": i % 50, "price": 25 + i % 75,
+         "potion_type": [i % 101, 0, 100 - i % 101, 0]}
+        for i in range(size)
+    ]
+
+
+def search_page(size):
+    timestamp = datetime(2026, 1, 1).isoformat()
+    return {
+        "previous": "eyJkIjoicHJldmlvdXMifQ",
+        "next": "eyJkIjoibmV4dCJ9",
+        "results": [
+            {"cart_id": i, "item_sku": f"{1 + i % 5} POTION {i}s", "customer_name": f"customer {i}",
+             "line_item_total": 50 + i, "timestamp": timestamp}
+            for i in range(size)
+        ],
+    }
+
+
+def bottle_plan(size):
+    return [{"potion_type": [i % 101, 0, 100 - i % 101, 0], "quantity": 1 + i % 20} for i in range(size)]
+
+
+PAYLOADS = [
+    ("catalog", catalog, list[CatalogItem]),
+    ("search", search_page, SearchPage),
+    ("bottle plan", bottle_plan, list[PotionInventory]),
+]
+
+
+def per_call(fn):
+    """Seconds per call, repeating until MIN_SECONDS have passed."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SECONDS:
+            return elapsed / calls
+
+
+def main():
+    print(f"{'payload':<12} {'size':>6} {'validated':>11} {'default':>11} {'orjson':>11} {'precomputed':>12}  (us per response)")
+    for name, build, model in PAYLOADS:
+        for size in SIZES:
+            payload = build(size)
+            body = orjson.dumps(payload)
+            timings = [
+                per_call(lambda: JSONResponse(jsonable_encoder(parse_obj_as(model, payload)))),
+                per_call(lambda: JSONResponse(jsonable_encoder(payload))),
+                per_call(lambda: ORJSONResponse(payload)),
+                per_call(lambda: Response(body, media_type="application/json")),
+            ]
+            validated, default, fast, precomputed = (seconds * 1e6 for seconds in timings)
+            print(f"{name:<12} {size:>6} {validated:>11.1f} {default:>11.1f} {fast:>11.1f} {precomputed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+-- Baseline schema for the shop.
+--
+-- Every statement is IF NOT EXISTS so this can also be recorded against a
+-- database that was created by hand before migrations existed.
+
+CREATE TABLE IF NOT EXISTS potions (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    sku text NOT NULL,
+    name text NOT NULL,
+    price int NOT NULL,
+    red int NOT NULL DEFAULT 0,
+    green int NOT NULL DEFAULT 0,
+    blue int NOT NULL DEFAULT 0,
+    dark int NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS capacity (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    potion_capacity int NOT NULL DEFAULT 1,
+    ml_capacity int NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS gold_ledger (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    quantity_change int NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ml_ledger (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    red_change int NOT NULL DEFAULT 0,
+    green_change int NOT NULL DEFAULT 0,
+    blue_change int NOT NULL DEFAULT 0,
+    dark_change int NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS potion_ledger (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    potion_id bigint NOT NULL REFERENCES potions (id),
+    quantity_change int NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS carts (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    customer_name text NOT NULL,
+    character_class text NOT NULL,
+    level int NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cart_items (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    cart_id bigint NOT NULL REFERENCES carts (id),
+    potion_id bigint NOT NULL REFERENCES potions (id),
+    item_sku text NOT NULL,
+    quantity int NOT NULL,
+    cost int NOT NULL
+);
+
+-- a new shop starts with one unit of each capacity and 100 gold
+INSERT INTO capacity (potion_capacity, ml_capacity)
+SELECT 1, 1
+WHERE NOT EXISTS (SELECT 1 FROM capacity);
+
+INSERT INTO gold_ledger (quantity_change)
+SELECT 100
+WHERE NOT EXISTS (SELECT 1 FROM gold_ledger);
@@ -0,0 +1,146 @@
+-- Materialized running balances for gold_ledger, ml_ledger and potion_ledger.
+--
+-- The ledgers stay append-only and remain the source of truth. Statement-level
+-- triggers fold every INSERT, DELETE and TRUNCATE into the balance tables, so
+-- reading current inventory no longer scans the full ledger history.
+
+CREATE TABLE IF NOT EXISTS ledger_balances (
+    id int PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    gold bigint NOT NULL DEFAULT 0,
+    red_ml bigint NOT NULL DEFAULT 0,
+    green_ml bigint NOT NULL DEFAULT 0,
+    blue_ml bigint NOT NULL DEFAULT 0,
+    dark_ml bigint NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS potion_balances (
+    potion_id bigint PRIMARY KEY REFERENCES potions (id),
+    quantity bigint NOT NULL DEFAULT 0
+);
+
+-- gold
+CREATE OR REPLACE FUNCTION apply_gold_ledger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE ledger_balances
+        SET gold = gold + (SELECT COALESCE(SUM(quantity_change), 0) FROM new_rows)
+        WHERE id = 1;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE ledger_balances
+        SET gold = gold - (SELECT COALESCE(SUM(quantity_change), 0) FROM old_rows)
+        WHERE id = 1;
+    ELSE
+        UPDATE ledger_balances SET gold = 0 WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS gold_ledger_insert ON gold_ledger;
+DROP TRIGGER IF EXISTS gold_ledger_delete ON gold_ledger;
+DROP TRIGGER IF EXISTS gold_ledger_truncate ON gold_ledger;
+CREATE TRIGGER gold_ledger_insert AFTER INSERT ON gold_ledger
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_gold_ledger();
+CREATE TRIGGER gold_ledger_delete AFTER DELETE ON gold_ledger
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_gold_ledger();
+CREATE TRIGGER gold_ledger_truncate AFTER TRUNCATE ON gold_ledger
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_gold_ledger();
+
+-- ml
+CREATE OR REPLACE FUNCTION apply_ml_ledger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE ledger_balances b
+        SET red_ml = b.red_ml + d.red,
+            green_ml = b.green_ml + d.green,
+            blue_ml = b.blue_ml + d.blue,
+            dark_ml = b.dark_ml + d.dark
+        FROM (
+            SELECT COALESCE(SUM(red_change), 0) AS red, COALESCE(SUM(green_change), 0) AS green,
+                   COALESCE(SUM(blue_change), 0) AS blue, COALESCE(SUM(dark_change), 0) AS dark
+            FROM new_rows
+        ) d
+        WHERE b.id = 1;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE ledger_balances b
+        SET red_ml = b.red_ml - d.red,
+            green_ml = b.green_ml - d.green,
+            blue_ml = b.blue_ml - d.blue,
+            dark_ml = b.dark_ml - d.dark
+        FROM (
+            SELECT COALESCE(SUM(red_change), 0) AS red, COALESCE(SUM(green_change), 0) AS green,
+                   COALESCE(SUM(blue_change), 0) AS blue, COALESCE(SUM(dark_change), 0) AS dark
+            FROM old_rows
+        ) d
+        WHERE b.id = 1;
+    ELSE
+        UPDATE ledger_balances SET red_ml = 0, green_ml = 0, blue_ml = 0, dark_ml = 0 WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS ml_ledger_insert ON ml_ledger;
+DROP TRIGGER IF EXISTS ml_ledger_delete ON ml_ledger;
+DROP TRIGGER IF EXISTS ml_ledger_truncate ON ml_ledger;
+CREATE TRIGGER ml_ledger_insert AFTER INSERT ON ml_ledger
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_ml_ledger();
+CREATE TRIGGER ml_ledger_delete AFTER DELETE ON ml_ledger
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_ml_ledger();
+CREATE TRIGGER ml_ledger_truncate AFTER TRUNCATE ON ml_ledger
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_ml_ledger();
+
+-- potions, one balance row per potion
+CREATE OR REPLACE FUNCTION apply_potion_ledger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO potion_balances (potion_id, quantity)
+        SELECT potion_id, SUM(quantity_change) FROM new_rows GROUP BY potion_id
+        ON CONFLICT (potion_id) DO UPDATE SET quantity = potion_balances.quantity + EXCLUDED.quantity;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE potion_balances b
+        SET quantity = b.quantity - d.quantity
+        FROM (SELECT potion_id, SUM(quantity_change) AS quantity FROM old_rows GROUP BY potion_id) d
+        WHERE b.potion_id = d.potion_id;
+    ELSE
+        DELETE FROM potion_balances;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS potion_ledger_insert ON potion_ledger;
+DROP TRIGGER IF EXISTS potion_ledger_delete ON potion_ledger;
+DROP TRIGGER IF EXISTS potion_ledger_truncate ON potion_ledger;
+CREATE TRIGGER potion_ledger_insert AFTER INSERT ON potion_ledger
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_potion_ledger();
+CREATE TRIGGER potion_ledger_delete AFTER DELETE ON potion_ledger
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_potion_ledger();
+CREATE TRIGGER potion_ledger_truncate AFTER TRUNCATE ON potion_ledger
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_potion_ledger();
+
+-- backfill from the existing history while writers are held off
+LOCK TABLE gold_ledger, ml_ledger, potion_ledger IN SHARE ROW EXCLUSIVE MODE;
+
+INSERT INTO ledger_balances (id, gold, red_ml, green_ml, blue_ml, dark_ml)
+SELECT 1,
+       (SELECT COALESCE(SUM(quantity_change), 0) FROM gold_ledger),
+       COALESCE(SUM(red_change), 0), COALESCE(SUM(green_change), 0),
+       COALESCE(SUM(blue_change), 0), COALESCE(SUM(dark_change), 0)
+FROM ml_ledger
+ON CONFLICT (id) DO UPDATE SET
+    gold = EXCLUDED.gold,
+    red_ml = EXCLUDED.red_ml,
+    green_ml = EXCLUDED.green_ml,
+    blue_ml = EXCLUDED.blue_ml,
+    dark_ml = EXCLUDED.dark_ml;
+
+DELETE FROM potion_balances;
+INSERT INTO potion_balances (potion_id, quantity)
+SELECT potion_id, SUM(quantity_change) FROM potion_ledger GROUP BY potion_id;
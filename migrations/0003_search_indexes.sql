@@ -0,0 +1,27 @@
+-- Indexes for /carts/search.
+--
+-- Trigram GIN indexes let the '%term%' ILIKE filters on customer_name and
+-- item_sku use an index instead of scanning every cart item.
+--
+-- Keyset pagination orders by (sort column, cart_items.id) and compares that
+-- pair against the cursor. For item_sku and line_item_total the sort column
+-- is on cart_items, so (item_sku, id) and (cost, id) match the order exactly
+-- and a page is a range scan. For timestamp and customer_name the sort column
+-- is on carts, and no index can span both tables: (created_at, id) and
+-- (customer_name, id) only give the leading column in order, carts.id is not
+-- the tie-breaker, and Postgres sorts rows that tie on the sort column by
+-- cart_items.id after the join (an incremental sort), with only the sort
+-- column half of the cursor bound served by the index.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS carts_customer_name_trgm_idx
+    ON carts USING gin (customer_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS cart_items_item_sku_trgm_idx
+    ON cart_items USING gin (item_sku gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS carts_created_at_idx ON carts (created_at, id);
+CREATE INDEX IF NOT EXISTS carts_customer_name_idx ON carts (customer_name, id);
+CREATE INDEX IF NOT EXISTS cart_items_item_sku_id_idx ON cart_items (item_sku, id);
+CREATE INDEX IF NOT EXISTS cart_items_cost_id_idx ON cart_items (cost, id);
+CREATE INDEX IF NOT EXISTS cart_items_cart_id_idx ON cart_items (cart_id, id);
@@ -0,0 +1,11 @@
+-- Indexes for the hot lookups outside of search.
+--
+-- potion_ledger(potion_id) backs per-potion balance rebuilds and the catalog.
+-- cart_items(cart_id) for checkout is created in 0003_search_indexes.sql.
+-- potions are looked up by sku when adding to carts and by recipe when
+-- bottling; both are unique per potion.
+
+CREATE INDEX IF NOT EXISTS potion_ledger_potion_id_idx ON potion_ledger (potion_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS potions_sku_idx ON potions (sku);
+CREATE UNIQUE INDEX IF NOT EXISTS potions_recipe_idx ON potions (red, green, blue, dark);
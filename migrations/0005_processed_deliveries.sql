@@ -0,0 +1,14 @@
+-- Deliveries already applied, keyed by endpoint and order_id.
+--
+-- The delivery endpoints claim (endpoint, order_id) here in the same
+-- transaction as their ledger writes. A retried delivery hits the primary key
+-- and gets the stored response back instead of writing the ledgers again.
+-- See src/idempotency.py.
+
+CREATE TABLE IF NOT EXISTS processed_deliveries (
+    endpoint text NOT NULL,
+    order_id bigint NOT NULL,
+    response jsonb,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (endpoint, order_id)
+);
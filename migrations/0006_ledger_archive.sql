@@ -0,0 +1,36 @@
+-- Archive tables for ledger compaction (src/compaction.py).
+--
+-- Compaction moves ledger rows older than a horizon into these tables and
+-- replaces them with summary rows, flagged with summary = true, that carry
+-- the same totals. Summary rows are never archived, so the archive plus the
+-- non-summary rows still in a ledger is the complete history, and the
+-- balance triggers see a delete and an insert of the same amount.
+
+ALTER TABLE gold_ledger ADD COLUMN IF NOT EXISTS summary boolean NOT NULL DEFAULT false;
+ALTER TABLE ml_ledger ADD COLUMN IF NOT EXISTS summary boolean NOT NULL DEFAULT false;
+ALTER TABLE potion_ledger ADD COLUMN IF NOT EXISTS summary boolean NOT NULL DEFAULT false;
+
+CREATE TABLE IF NOT EXISTS gold_ledger_archive (
+    id bigint PRIMARY KEY,
+    created_at timestamptz NOT NULL,
+    quantity_change int NOT NULL,
+    archived_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS ml_ledger_archive (
+    id bigint PRIMARY KEY,
+    created_at timestamptz NOT NULL,
+    red_change int NOT NULL,
+    green_change int NOT NULL,
+    blue_change int NOT NULL,
+    dark_change int NOT NULL,
+    archived_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS potion_ledger_archive (
+    id bigint PRIMARY KEY,
+    created_at timestamptz NOT NULL,
+    potion_id bigint NOT NULL,
+    quantity_change int NOT NULL,
+    archived_at timestamptz NOT NULL DEFAULT now()
+);
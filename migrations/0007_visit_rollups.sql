@@ -0,0 +1,13 @@
+-- Customer visits rolled up by game day and hour, character class and level
+-- band. src/visits.py counts visits in memory and upserts its counts here
+-- periodically, so the table grows with distinct keys, not with visits.
+-- hour is -1 and day is '' for visits counted before the first /info/current_time.
+
+CREATE TABLE IF NOT EXISTS visit_rollups (
+    day text NOT NULL,
+    hour int NOT NULL,
+    character_class text NOT NULL,
+    level_band text NOT NULL,
+    visits int NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, hour, character_class, level_band)
+);
@@ -0,0 +1,13 @@
+-- Potions sold rolled up by game day and hour. Checkout adds each sale here
+-- in the same transaction as its ledger writes, so the planners and analytics
+-- can ask what sells without scanning cart_items and carts.
+-- hour is -1 and day is '' for sales made before the first /info/current_time.
+
+CREATE TABLE IF NOT EXISTS sales_rollups (
+    day text NOT NULL,
+    hour int NOT NULL,
+    potion_id bigint NOT NULL REFERENCES potions (id),
+    quantity bigint NOT NULL DEFAULT 0,
+    gold bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, hour, potion_id)
+);
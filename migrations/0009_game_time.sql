@@ -0,0 +1,12 @@
+-- The current game day and hour, as last reported by /info/current_time.
+-- A single row, so every instance stamps sales_rollups with the same game
+-- time, read inside the checkout transaction, instead of whatever its own
+-- process last heard. day is '' and hour is -1 until the first report.
+
+CREATE TABLE IF NOT EXISTS game_time (
+    id int PRIMARY KEY CHECK (id = 1),
+    day text NOT NULL,
+    hour int NOT NULL
+);
+
+INSERT INTO game_time (id, day, hour) VALUES (1, '', -1) ON CONFLICT (id) DO NOTHING;
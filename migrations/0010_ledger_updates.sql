@@ -0,0 +1,28 @@
+-- Keep the ledgers append-only for the balance triggers of 0002.
+--
+-- ledger_balances and potion_balances are kept by statement-level triggers
+-- on INSERT, DELETE and TRUNCATE. An UPDATE of a ledger row would change the
+-- history without touching the balances, so it is rejected instead. Correct
+-- a mistake with a new entry for the difference, the way compaction moves
+-- rows with a delete and an insert of the same amount.
+--
+-- ledger_balances is a single row, so every gold or ml write, including each
+-- checkout's gold entry, holds its row lock until it commits and those
+-- transactions commit one at a time. Group commit (LEDGER_WRITER=group, see
+-- src/ledger_writer.py) takes that lock once per group of requests.
+
+CREATE OR REPLACE FUNCTION reject_ledger_update() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION '% is append-only: insert a correcting entry instead of updating rows', TG_TABLE_NAME;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS gold_ledger_update ON gold_ledger;
+DROP TRIGGER IF EXISTS ml_ledger_update ON ml_ledger;
+DROP TRIGGER IF EXISTS potion_ledger_update ON potion_ledger;
+CREATE TRIGGER gold_ledger_update BEFORE UPDATE ON gold_ledger
+    FOR EACH STATEMENT EXECUTE FUNCTION reject_ledger_update();
+CREATE TRIGGER ml_ledger_update BEFORE UPDATE ON ml_ledger
+    FOR EACH STATEMENT EXECUTE FUNCTION reject_ledger_update();
+CREATE TRIGGER potion_ledger_update BEFORE UPDATE ON potion_ledger
+    FOR EACH STATEMENT EXECUTE FUNCTION reject_ledger_update();
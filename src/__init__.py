@@ -0,0 +1,10 @@
+import os
+
+# Modules read their settings from the environment when they are imported,
+# so .env is loaded once, here, before any of them. Deployments that set the
+# environment directly ship no .env and skip importing python-dotenv.
+_env_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+if os.path.exists(_env_file):
+    import dotenv
+
+    dotenv.load_dotenv(_env_file)
@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, Request
 from pydantic import BaseModel
 from src.api import auth
-import sqlalchemy
+from src.storage.base import Store
+from src import catalog_cache
 from src import database as db
+from src import recipes
+from src import visits
 
 router = APIRouter(
     prefix="/admin",
@@ -11,25 +14,38 @@ router = APIRouter(
 )
 
 @router.post("/reset")
-def reset():
+def reset(store: Store = Depends(db.get_store)):
     """
     Reset the game state. Gold goes to 100, all potions are removed from inventory,
     and all barrels are removed from inventory. Carts are all reset.
     """
-    
-    with db.engine.connect() as connection:
 
-        # clear ledgers
-        connection.execute(sqlalchemy.text("TRUNCATE TABLE gold_ledger"))
-        connection.execute(sqlalchemy.text("TRUNCATE TABLE ml_ledger"))
-        connection.execute(sqlalchemy.text("TRUNCATE TABLE potion_ledger"))
+    # clears the ledgers, carts, visit rollups and processed deliveries (a new
+    # game reuses order ids), then puts 100 gold back
+    store.reset()
+    store.commit()
 
-        # clear carts
-        connection.execute(sqlalchemy.text("TRUNCATE TABLE cart_items"))
-        connection.execute(sqlalchemy.text("TRUNCATE TABLE carts CASCADE"))
-    
-        # insert 100 gold
-        connection.execute(sqlalchemy.text("INSERT INTO gold_ledger (quantity_change) VALUES (:quantity_change)"), {'quantity_change': 100})
-        connection.commit()
+    recipes.invalidate()
+    catalog_cache.invalidate()
+    visits.reset()
+    return "OK"
+
+@router.get("/pool_status")
+def get_pool_status():
+    """
+    Connection pool usage: pool size, checked out and overflow connections,
+    and how long requests have waited to get a connection.
+    """
+    return db.pool_status()
+
+@router.post("/invalidate_cache")
+def invalidate_cache():
+    """
+    Drop the cached potion recipes and catalog so the next request reloads
+    them from the database. Call this after editing potions directly in the
+    database.
+    """
+    recipes.invalidate()
+    catalog_cache.invalidate()
     return "OK"
 
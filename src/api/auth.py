@@ -1,9 +1,6 @@
 from fastapi import Security, HTTPException, status, Request
 from fastapi.security.api_key import APIKeyHeader
 import os
-import dotenv
-
-dotenv.load_dotenv()
 
 api_keys = []  
 
@@ -1,11 +1,21 @@
 from fastapi import APIRouter, Depends, Request
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, conint
 from src.api import auth
 from enum import Enum
-import sqlalchemy
+from src.storage.base import Store
+from src import catalog_cache
 from src import database as db
+from src import ledger_writer
+from src import log
+from src import recipes
+from src import sales
+from src import visits
 from fastapi import HTTPException
 from datetime import datetime
+from typing import Optional
+import base64
+import json
 
 router = APIRouter(
     prefix="/carts",
@@ -13,6 +23,15 @@ router = APIRouter(
     dependencies=[Depends(auth.get_api_key)],
 )
 
+logger = log.get_logger("carts")
+
+# same endpoints served on the asyncio engine, mounted instead of `router` when ASYNC_DB is set
+async_router = APIRouter(
+    prefix="/carts",
+    tags=["cart"],
+    dependencies=[Depends(auth.get_api_key)],
+)
+
 class search_sort_options(str, Enum):
     customer_name = "customer_name"
     item_sku = "item_sku"
@@ -23,69 +42,115 @@ class search_sort_order(str, Enum):
     asc = "asc"
     desc = "desc"   
 
-@router.get("/search/", tags=["search"])
+MAX_SEARCH_PAGE_SIZE = 100
+
+class SearchResult(BaseModel):
+    cart_id: int
+    item_sku: str
+    customer_name: str
+    line_item_total: int
+    timestamp: str
+
+class SearchPage(BaseModel):
+    previous: str
+    next: str
+    results: list[SearchResult]
+
+def encode_page_token(direction: str, row, sort_col: search_sort_options):
+    """Opaque cursor pointing just past (or before) a search result row."""
+    sort_value = row.sort_value
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps({"d": direction, "c": sort_col.value, "v": sort_value, "id": row.id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_page_token(token: str, sort_col: search_sort_options):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, sort_value, last_id = payload["d"], payload["v"], int(payload["id"])
+        if direction not in ("next", "previous") or payload["c"] != sort_col.value:
+            raise ValueError(direction)
+        if sort_col == search_sort_options.timestamp:
+            sort_value = datetime.fromisoformat(sort_value)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid page token.")
+    return direction, sort_value, last_id
+
+@router.get("/search/", tags=["search"], response_model=SearchPage)
 def search_orders(
     customer_name: str = "",
     potion_sku: str = "",
     search_page: str = "",
     sort_col: search_sort_options = search_sort_options.timestamp,
     sort_order: search_sort_order = search_sort_order.desc,
+    page_size: int = 5,
+    store: Store = Depends(db.get_read_store),
 ):
-    
-    if search_page == "":
-        search_page = "0"
+    """
+    Search cart line items with keyset pagination. `search_page` is an opaque
+    token taken from the `next` or `previous` field of an earlier response;
+    leave it empty (or "0") for the first page.
+    """
+    # the page is built to match SearchPage, so it is serialized without revalidating
+    return ORJSONResponse(
+        _search_orders(store, customer_name, potion_sku, search_page, sort_col, sort_order, page_size)
+    )
 
-    order = "DESC" if sort_order == search_sort_order.desc else "ASC"
+@async_router.get("/search/", tags=["search"], response_model=SearchPage)
+async def search_orders_async(
+    customer_name: str = "",
+    potion_sku: str = "",
+    search_page: str = "",
+    sort_col: search_sort_options = search_sort_options.timestamp,
+    sort_order: search_sort_order = search_sort_order.desc,
+    page_size: int = 5,
+):
+    page = await db.run_read_async(
+        _search_orders, customer_name, potion_sku, search_page, sort_col, sort_order, page_size
+    )
+    return ORJSONResponse(page)
 
-    sort_column = 'ci.cost' if sort_col == search_sort_options.line_item_total else sort_col.value
+def _search_orders(store, customer_name, potion_sku, search_page, sort_col, sort_order, page_size):
+    if page_size < 1 or page_size > MAX_SEARCH_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page_size must be between 1 and {MAX_SEARCH_PAGE_SIZE}.")
 
-    try:
-        cur_page = int(search_page) * 5
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid page number.")
-
-    sql_to_execute = f"""
-    SELECT
-        cart.customer_name,
-        ci.item_sku,
-        ci.quantity,
-        ci.cart_id,
-        ci.cost AS line_item_total,
-        cart.created_at AS timestamp
-    FROM
-        cart_items ci
-    JOIN
-        carts cart ON ci.cart_id = cart.id
-    WHERE
-        (:customer_name = '' AND :potion_sku = '') OR
-        (:customer_name != '' AND :potion_sku != '' AND cart.customer_name ILIKE :customer_name AND ci.item_sku ILIKE :potion_sku) OR
-        (:customer_name = '' AND ci.item_sku ILIKE :potion_sku) OR
-        (:potion_sku = '' AND cart.customer_name ILIKE :customer_name)
-    ORDER BY
-        {sort_column} {order}, ci.cart_id ASC
-    LIMIT
-        5 OFFSET :cur_page
-    """
+    descending = sort_order == search_sort_order.desc
+
+    # walking backwards flips both the comparison and the scan order
+    direction = "next"
+    after = None
+    if search_page not in ("", "0"):
+        direction, sort_value, last_id = decode_page_token(search_page, sort_col)
+        forward = direction == "next"
+        after = ("<" if descending == forward else ">", sort_value, last_id)
+
+    scan_descending = descending == (direction == "next")
+    rows = store.search_line_items(customer_name, potion_sku, sort_col.value, scan_descending, after, page_size + 1)
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == "previous":
+        rows.reverse()
 
     return_list = []
-    with db.engine.begin() as connection:
-        result = connection.execute(sqlalchemy.text(sql_to_execute), {
-            "cur_page": cur_page,
-            "customer_name": f'%{customer_name}%',
-            "potion_sku": f'%{potion_sku}%'
+    for row in rows:
+        plural = "s" if row.quantity > 1 else ""
+        return_list.append({
+            "cart_id": row.cart_id,
+            "item_sku": f"{row.quantity} {row.item_sku.replace('_', ' ')}{plural}",
+            "customer_name": row.customer_name,
+            "line_item_total": row.line_item_total,
+            "timestamp": row.timestamp.isoformat(),
         })
-        for row in result:
-            plural = "s" if row.quantity > 1 else ""
-            return_list.append({
-                "cart_id": row.cart_id,
-                "item_sku": f"{row.quantity} {row.item_sku.replace('_', ' ')}{plural}",
-                "customer_name": row.customer_name,
-                "line_item_total": row.line_item_total,
-                "timestamp": row.timestamp.isoformat(),
-            })
-
-    next_page = str(int(search_page) + 1) if len(return_list) == 5 else ""
-    previous_page = str(int(search_page) - 1) if int(search_page) > 0 else ""
+
+    # a page reached from a cursor always has a neighbour in the direction it came from
+    came_from_cursor = after is not None
+    has_next = has_more if direction == "next" else came_from_cursor
+    has_previous = has_more if direction == "previous" else came_from_cursor
+
+    next_page = encode_page_token("next", rows[-1], sort_col) if rows and has_next else ""
+    previous_page = encode_page_token("previous", rows[0], sort_col) if rows and has_previous else ""
 
     return {
         "previous": previous_page,
@@ -103,117 +168,189 @@ def post_visits(visit_id: int, customers: list[Customer]):
     """
     Which customers visited the shop today?
     """
-    print(customers)
+    logger.debug("customers visited", visit_id=visit_id, customers=customers)
+
+    # counted in memory; the rollup table is only written when a flush is due
+    visits.ingest(customers)
+    if visits.flush_due():
+        try:
+            with db.session() as store:
+                visits.flush(store)
+        except Exception as e:
+            logger.warning("visit rollup flush failed, will retry", error=str(e))
+
+    return "OK"
+
+@async_router.post("/visits/{visit_id}")
+async def post_visits_async(visit_id: int, customers: list[Customer]):
+    logger.debug("customers visited", visit_id=visit_id, customers=customers)
+
+    visits.ingest(customers)
+    if visits.flush_due():
+        try:
+            await db.run_async(visits.flush)
+        except Exception as e:
+            logger.warning("visit rollup flush failed, will retry", error=str(e))
 
     return "OK"
 
 carts = {}
 
 @router.post("/")
-def create_cart(new_cart: Customer):
+def create_cart(new_cart: Customer, store: Store = Depends(db.get_store)):
     """Create a new cart with a unique identifier for a specific customer."""
+    try:
+        result = _create_cart(store, new_cart)
+        store.commit()
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=400, detail="Failed to create cart") from e
 
-    sql = """
-    INSERT INTO carts (created_at, character_class, customer_name, level)
-    VALUES (:created_at, :character_class, :customer_name, :level)
-    RETURNING id;
-    """
+@async_router.post("/")
+async def create_cart_async(new_cart: Customer):
     try:
-        with db.engine.connect() as connection:
-            result = connection.execute(sqlalchemy.text(sql), {
-                'created_at': datetime.now(),
-                'character_class': new_cart.character_class,
-                'customer_name': new_cart.customer_name,
-                'level': new_cart.level
-            })
-            connection.commit()
-            cart_id = result.fetchone()[0]
-            print(f"DEBUG: CREATE CART: {cart_id}")
-            return {"cart_id": cart_id}
+        return await db.run_async(_create_cart, new_cart)
     except Exception as e:
         raise HTTPException(status_code=400, detail="Failed to create cart") from e
 
+def _create_cart(store, new_cart: Customer):
+    cart_id = store.create_cart(new_cart.customer_name, new_cart.character_class, new_cart.level, datetime.now())
+    logger.debug("cart created", cart_id=cart_id)
+    return {"cart_id": cart_id}
+
 
 class CartItem(BaseModel):
     quantity: int
 
 @router.post("/{cart_id}/items/{item_sku}")
-def set_item_quantity(cart_id: int, item_sku: str, cart_item: CartItem):
+def set_item_quantity(cart_id: int, item_sku: str, cart_item: CartItem, store: Store = Depends(db.get_store)):
     """Update the quantity of an item in the cart."""
+    try:
+        _set_item_quantity(store, cart_id, item_sku, cart_item)
+        store.commit()
+        return {"success": True}
+    except HTTPException as e:
+        store.rollback()
+        return {"success": False, "message": e.detail}
+    except Exception as e:
+        store.rollback()
+        return {"success": False, "message": str(e)}
 
-    validate_cart_sql = """
-    SELECT EXISTS(SELECT 1 FROM carts WHERE id = :cart_id);
-    """
-    
-    new_cart_item_sql = """
-        INSERT INTO cart_items (cart_id, item_sku, quantity, potion_id, created_at, cost) 
-        SELECT :cart_id, :item_sku, :quantity, potions.id, :created_at, (:quantity * potions.price) AS cost
-        FROM potions
-        WHERE potions.sku = :item_sku
-    """
+@async_router.post("/{cart_id}/items/{item_sku}")
+async def set_item_quantity_async(cart_id: int, item_sku: str, cart_item: CartItem):
     try:
-        with db.engine.connect() as connection:
-            # validate cart ID
-            cart_exists = connection.execute(sqlalchemy.text(validate_cart_sql), {'cart_id': cart_id}).scalar()
-            if not cart_exists:
-                raise HTTPException(status_code=404, detail="Cart not found")
-
-            # set item quantity and calculate cost in cart
-            connection.execute(sqlalchemy.text(new_cart_item_sql), {
-                'cart_id': cart_id,
-                'item_sku': item_sku,
-                'quantity': cart_item.quantity,
-                'created_at': datetime.now()
-            })
-            connection.commit()
-            return {"success": True}
+        await db.run_async(_set_item_quantity, cart_id, item_sku, cart_item)
+        return {"success": True}
+    except HTTPException as e:
+        return {"success": False, "message": e.detail}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
+def _set_item_quantity(store, cart_id: int, item_sku: str, cart_item: CartItem):
+    # validate cart ID
+    if not store.cart_exists(cart_id):
+        raise HTTPException(status_code=404, detail="Cart not found")
+
+    # look up the potion id and price from the recipe cache
+    potion = recipes.by_sku(store, item_sku)
+    if potion is None:
+        raise HTTPException(status_code=404, detail="Potion not found")
+
+    # set item quantity and calculate cost in cart
+    store.add_cart_items(cart_id, [(item_sku, cart_item.quantity, potion.id, cart_item.quantity * potion.price)])
+
 class CartCheckout(BaseModel):
     payment: str     
 
 @router.post("/{cart_id}/checkout")
 def checkout(cart_id: int, cart_checkout: CartCheckout):
-    print(f"DEBUG: CHECKOUT for Cart ID: {cart_id} with Payment Method: {cart_checkout.payment}")
-
-    with db.engine.begin() as connection:
-        #fetch all potions from cart_items
-        cart_sql = """
-            SELECT cart_items.quantity, cart_items.potion_id, potions.price
-            FROM cart_items
-            JOIN potions ON cart_items.potion_id = potions.id
-            WHERE cart_items.cart_id = :cart_id;
-        """
-        result = connection.execute(sqlalchemy.text(cart_sql), {'cart_id': cart_id})
-        cart_items = result.mappings().all() 
-        if not cart_items:
-            raise HTTPException(status_code=404, detail="Cart is empty or does not exist")
-
-        total_gold_paid = 0
-
-        # process items in cart
-        for item in cart_items:
-            quantity = item['quantity']
-            price_per_potion = item['price']
-
-            total_cost = price_per_potion * quantity
-            total_gold_paid += total_cost
-
-            # update potion inventory
-            update_potions = """
-            INSERT INTO potion_ledger (potion_id, quantity_change) VALUES(:potion_id, :quantity_change)
-            """
-            connection.execute(sqlalchemy.text(update_potions), {
-                'potion_id': item['potion_id'],
-                'quantity_change': -quantity
-            })
-
-        # update gold
-        if total_gold_paid > 0:
-            connection.execute(sqlalchemy.text("INSERT INTO gold_ledger (quantity_change) VALUES (:quantity_change)"), {'quantity_change': total_gold_paid})
+    result = ledger_writer.run(_checkout, cart_id, cart_checkout)
+    catalog_cache.invalidate()
+    return result
+
+@async_router.post("/{cart_id}/checkout")
+async def checkout_async(cart_id: int, cart_checkout: CartCheckout):
+    result = await ledger_writer.run_async(_checkout, cart_id, cart_checkout)
+    catalog_cache.invalidate()
+    return result
+
+def _checkout(store, cart_id: int, cart_checkout: CartCheckout):
+    logger.debug("checkout", cart_id=cart_id, payment=cart_checkout.payment)
+
+    # hold the stock of every potion in the cart until commit, so concurrent
+    # checkouts for the same sku can't both sell the last one
+    cart_items = store.reserve_cart(cart_id)
+    if not cart_items:
+        raise HTTPException(status_code=404, detail="Cart is empty or does not exist")
+
+    # a potion that has never been in stock has 0 in stock
+    if any(item.quantity > item.in_stock for item in cart_items):
+        raise HTTPException(status_code=409, detail="Not enough potions in stock")
+
+    # take every line out of inventory at once
+    store.take_cart_items(cart_id)
+
+    # charge what the lines cost when they were added, not today's price
+    sold = [(item.potion_id, item.quantity, item.cost) for item in cart_items]
+    total_gold_paid = sum(gold for _, _, gold in sold)
+
+    # count the sale in this game hour's rollup
+    sales.record(store, sold)
+
+    # update gold last: its trigger locks the single ledger_balances row that
+    # every checkout shares until commit, so checkouts of different skus only
+    # queue for the end of the transaction (see "Group commit" in the README)
+    if total_gold_paid > 0:
+        store.record_gold(total_gold_paid)
 
     return {
-        "total_potions_bought": sum(item['quantity'] for item in cart_items),
+        "total_potions_bought": sum(item.quantity for item in cart_items),
         "total_gold_paid": total_gold_paid
-    }
\ No newline at end of file
+    }
+
+class CartLine(BaseModel):
+    sku: str
+    quantity: conint(gt=0)
+
+class CartBatch(BaseModel):
+    customer: Customer
+    items: list[CartLine]
+    checkout: Optional[CartCheckout] = None
+
+@router.post("/batch")
+def create_cart_batch(cart_batch: CartBatch):
+    """
+    Create a cart with all of its items in one call, and check it out too if
+    `checkout` is given. Nothing is written unless every step succeeds.
+    """
+    # writes the ledgers when it checks out, so it commits like checkout does
+    result = ledger_writer.run(_create_cart_batch, cart_batch)
+    if cart_batch.checkout is not None:
+        catalog_cache.invalidate()
+    return result
+
+@async_router.post("/batch")
+async def create_cart_batch_async(cart_batch: CartBatch):
+    result = await ledger_writer.run_async(_create_cart_batch, cart_batch)
+    if cart_batch.checkout is not None:
+        catalog_cache.invalidate()
+    return result
+
+def _create_cart_batch(store, cart_batch: CartBatch):
+    # resolve every sku before writing anything
+    lines = []
+    for line in cart_batch.items:
+        potion = recipes.by_sku(store, line.sku)
+        if potion is None:
+            raise HTTPException(status_code=404, detail=f"Potion not found: {line.sku}")
+        lines.append((line.sku, line.quantity, potion.id, line.quantity * potion.price))
+
+    cart_id = _create_cart(store, cart_batch.customer)["cart_id"]
+
+    # all lines in one write
+    store.add_cart_items(cart_id, lines)
+
+    result = {"cart_id": cart_id}
+    if cart_batch.checkout is not None:
+        result.update(_checkout(store, cart_id, cart_batch.checkout))
+    return result
@@ -1,40 +1,71 @@
-from fastapi import APIRouter
-import sqlalchemy
-from src import database as db
-import sqlalchemy
+from fastapi import APIRouter, Header
+from fastapi.responses import Response
+from pydantic import BaseModel
+from typing import Optional
+from src import catalog_cache
 from src import database as db
+from src import log
 from fastapi import HTTPException
 import re
 
 router = APIRouter()
-@router.get("/catalog/", tags=["catalog"])
-def get_catalog():
-    # fetch potions along with total quantity available
-    sql = """
-    SELECT p.id, p.name, p.sku, p.price, COALESCE(SUM(pl.quantity_change), 0) as quantity,
-           p.red, p.green, p.blue, p.dark
-    FROM potions p
-    LEFT JOIN potion_ledger pl ON p.id = pl.potion_id
-    GROUP BY p.id, p.name, p.sku, p.price, p.red, p.green, p.blue, p.dark
-    HAVING COALESCE(SUM(pl.quantity_change), 0) > 0;
+# same endpoint served on the asyncio engine, mounted instead of `router` when ASYNC_DB is set
+async_router = APIRouter()
+
+logger = log.get_logger("catalog")
+
+class CatalogItem(BaseModel):
+    sku: str
+    name: str
+    quantity: int
+    price: int
+    potion_type: list[int]
+
+@router.get("/catalog/", tags=["catalog"], response_model=list[CatalogItem])
+def get_catalog(if_none_match: Optional[str] = Header(None)):
     """
+    Potions in stock. Served from the catalog cache between inventory changes,
+    with an ETag so clients can poll with If-None-Match and get a 304.
+    """
+    entry = catalog_cache.lookup()
+    if entry is None:
+        version = catalog_cache.version()
+        # only open a store on a miss, cache hits do no database work
+        with db.read_session() as store:
+            entry = catalog_cache.store(version, _get_catalog(store))
+    return _catalog_response(entry, if_none_match)
+
+@async_router.get("/catalog/", tags=["catalog"], response_model=list[CatalogItem])
+async def get_catalog_async(if_none_match: Optional[str] = Header(None)):
+    entry = catalog_cache.lookup()
+    if entry is None:
+        version = catalog_cache.version()
+        entry = catalog_cache.store(version, await db.run_read_async(_get_catalog))
+    return _catalog_response(entry, if_none_match)
 
+def _catalog_response(entry, if_none_match):
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if if_none_match and {entry["etag"], "*"} & {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+    # the body was serialized once when the catalog was cached
+    return Response(entry["body"], media_type="application/json", headers=headers)
+
+def _get_catalog(store):
     potions_for_sale = []
 
-    with db.engine.connect() as connection:
-        result = connection.execute(sqlalchemy.text(sql))
-        potion_data = result.fetchall()
+    # fetch potions along with total quantity available
+    potion_data = store.potions_in_stock()
 
-        for potion in potion_data:
-            potion_type = [potion.red, potion.green ,potion.blue, potion.dark]
+    for potion in potion_data:
+        potion_type = [potion.red, potion.green ,potion.blue, potion.dark]
 
-            potions_for_sale.append({
-                "sku": potion.sku,
-                "name": potion.name,
-                "quantity": potion.quantity,
-                "price": potion.price,
-                "potion_type": potion_type
-            })
+        potions_for_sale.append({
+            "sku": potion.sku,
+            "name": potion.name,
+            "quantity": potion.quantity,
+            "price": potion.price,
+            "potion_type": potion_type
+        })
 
-    print(f"DEBUG: POTIONS FOR SALE: {potions_for_sale}")
+    logger.debug("potions for sale", potions_for_sale=potions_for_sale)
     return potions_for_sale
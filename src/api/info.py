@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends, Request
 from pydantic import BaseModel
 from src.api import auth
+from src import database as db
+from src import log
+from src import visits
 
 router = APIRouter(
     prefix="/info",
@@ -8,6 +11,8 @@ router = APIRouter(
     dependencies=[Depends(auth.get_api_key)],
 )
 
+logger = log.get_logger("info")
+
 class Timestamp(BaseModel):
     day: str
     hour: int
@@ -17,5 +22,16 @@ def post_time(timestamp: Timestamp):
     """
     Share current time.
     """
+    # stored for every instance: checkout stamps sales with it
+    with db.session() as store:
+        store.set_game_time(timestamp.day, timestamp.hour)
+
+    # a new game hour starts a new tick of visit counts and flushes the last one
+    if visits.set_time(timestamp.day, timestamp.hour):
+        try:
+            with db.session() as store:
+                visits.flush(store)
+        except Exception as e:
+            logger.warning("visit rollup flush failed, will retry", error=str(e))
     return "OK"
 
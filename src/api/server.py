@@ -1,11 +1,21 @@
-from fastapi import FastAPI, exceptions
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, exceptions
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from pydantic import ValidationError
-from src.api import carts, catalog, bottler, barrels, admin, info, inventory
+from src import database as db
+from src import ledger_writer
+from src import log
+from src import metrics
+from src import visits
+import importlib
 import json
-import logging
 import sys
+import threading
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Match
+import time
+
+log.configure()
+logger = log.get_logger("server")
 
 description = """
 Central Coast Cauldrons is the premier ecommerce site for all your alchemical desires.
@@ -15,6 +25,7 @@ app = FastAPI(
     title="Central Coast Cauldrons",
     description=description,
     version="0.0.1",
+    default_response_class=ORJSONResponse,
     terms_of_service="http://example.com/terms/",
     contact={
         "name": "Lucas Pierce",
@@ -32,18 +43,83 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(inventory.router)
-app.include_router(carts.router)
-app.include_router(catalog.router)
-app.include_router(bottler.router)
-app.include_router(barrels.router)
-app.include_router(admin.router)
-app.include_router(info.router)
+# Routers are imported and mounted on the first request under their path
+# prefix, so a cold start only pays for the routers it serves. Any other path
+# (/docs, /openapi.json, a 404) mounts them all first. With ASYNC_DB set,
+# carts, catalog and inventory mount their async_router instead.
+ROUTERS = {
+    "carts": "src.api.carts",
+    "catalog": "src.api.catalog",
+    "inventory": "src.api.inventory",
+    "bottler": "src.api.bottler",
+    "barrels": "src.api.barrels",
+    "admin": "src.api.admin",
+    "info": "src.api.info",
+}
+ASYNC_ROUTERS = {"carts", "catalog", "inventory"}
+# paths the app serves itself
+UNROUTED = {"", "metrics"}
+
+_routers_lock = threading.Lock()
+_mounted = set()
+
+def mount_routers(path):
+    """Mount the router serving `path`, or every router if no prefix claims it."""
+    if len(_mounted) == len(ROUTERS):
+        return
+    segment = path.split("/", 2)[1] if path.startswith("/") else ""
+    if segment in UNROUTED:
+        return
+    names = [segment] if segment in ROUTERS else list(ROUTERS)
+    with _routers_lock:
+        for name in names:
+            if name in _mounted:
+                continue
+            module = importlib.import_module(ROUTERS[name])
+            use_async = db.ASYNC_DB and name in ASYNC_ROUTERS
+            app.include_router(module.async_router if use_async else module.router)
+            _mounted.add(name)
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    mount_routers(request.url.path)
+    metrics.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    metrics.finish_request(request.method, route_template(request), response.status_code, time.perf_counter() - start)
+    return response
+
+def route_template(request: Request):
+    """The route's path template, e.g. /carts/{cart_id}/checkout, so metrics aren't split per id."""
+    partial = "unmatched"
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial == "unmatched":
+            partial = route.path
+    return partial
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Request latency, per-request query counts and DB time in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("shutdown")
+def flush_on_shutdown():
+    # best effort: visits counted since the last flush are otherwise lost
+    try:
+        with db.session() as store:
+            visits.flush(store)
+    except Exception as e:
+        logger.warning("visit rollup flush on shutdown failed", error=str(e))
+    ledger_writer.stop()
+    log.shutdown()
 
 @app.exception_handler(exceptions.RequestValidationError)
 @app.exception_handler(ValidationError)
 async def validation_exception_handler(request, exc):
-    logging.error(f"The client sent invalid data!: {exc}")
+    logger.error("the client sent invalid data", errors=exc.errors())
     exc_json = json.loads(exc.json())
     response = {"message": [], "data": None}
     for error in exc_json:
@@ -0,0 +1,58 @@
+import hashlib
+import os
+import threading
+import time
+import orjson
+
+# In-process cache of the /catalog/ response. Anything that commits a
+# potion_ledger write (bottling, checkout, reset) calls invalidate() after the
+# commit, so repeated catalog reads in between cost no database work. Other
+# processes see the change once CATALOG_CACHE_TTL seconds have passed.
+
+TTL_SECONDS = float(os.environ.get("CATALOG_CACHE_TTL", 60))
+
+_lock = threading.Lock()
+_version = 0
+_entry = None
+
+
+def invalidate():
+    """Drop the cached catalog. Call after committing a potion_ledger change."""
+    global _version, _entry
+    with _lock:
+        _version += 1
+        _entry = None
+
+
+def version():
+    """Current cache version; pass it to store() along with the catalog read after it."""
+    with _lock:
+        return _version
+
+
+def lookup():
+    """The cached {"catalog", "body", "etag"} entry, or None on a miss."""
+    entry = _entry
+    if entry is None or time.monotonic() - entry["loaded_at"] >= TTL_SECONDS:
+        return None
+    return entry
+
+
+def store(read_version, catalog):
+    """
+    Cache a freshly read catalog and return its entry. The JSON body is
+    serialized once here and served as-is until the next invalidation.
+    Nothing is cached if the catalog was invalidated while it was being read.
+    """
+    global _entry
+    body = orjson.dumps(catalog, option=orjson.OPT_SORT_KEYS)
+    entry = {
+        "catalog": catalog,
+        "body": body,
+        "etag": f'"{hashlib.sha1(body).hexdigest()}"',
+        "loaded_at": time.monotonic(),
+    }
+    with _lock:
+        if read_version == _version:
+            _entry = entry
+    return entry
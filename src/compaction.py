@@ -0,0 +1,112 @@
+"""
+Compact the ledgers by archiving old rows behind summary rows.
+
+For gold_ledger, ml_ledger and potion_ledger, rows older than the horizon
+are moved to <ledger>_archive. In the same statement they are replaced by
+one summary row per ledger (one per potion for potion_ledger) that carries
+their total, so the balance triggers see equal and opposite changes and
+ledger_balances and potion_balances do not move. Each batch checks that
+the moved and summarized totals match before committing. Summary rows left
+by earlier runs are folded into the new ones instead of being archived a
+second time.
+
+    python -m src.compaction --older-than-days 30
+    python -m src.compaction --older-than-days 7 --batch-size 100000 --database-url postgresql+psycopg2://...
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+import sqlalchemy
+
+# data columns per ledger, and the columns a summary row is kept per
+LEDGERS = {
+    "gold_ledger": {"group_by": [], "columns": ["quantity_change"]},
+    "ml_ledger": {"group_by": [], "columns": ["red_change", "green_change", "blue_change", "dark_change"]},
+    "potion_ledger": {"group_by": ["potion_id"], "columns": ["quantity_change"]},
+}
+
+
+def _compact_statement(table, group_by, columns, condition, limited):
+    keys = ", ".join(group_by + columns)
+    sums = ", ".join(f"SUM({column})" for column in columns)
+    nonzero = " OR ".join(f"SUM({column}) <> 0" for column in columns)
+    totals = ", ".join(f"COALESCE(SUM({column}), 0)" for column in columns)
+    summary_keys = ", ".join(group_by + [sums]) if group_by else sums
+    grouping = f"GROUP BY {', '.join(group_by)}" if group_by else ""
+    limit = "LIMIT :batch_size" if limited else ""
+    return f"""
+    WITH moved AS (
+        DELETE FROM {table}
+        WHERE id IN (SELECT id FROM {table} WHERE {condition} ORDER BY id {limit})
+        RETURNING id, created_at, summary, {keys}
+    ), archived AS (
+        INSERT INTO {table}_archive (id, created_at, {keys})
+        SELECT id, created_at, {keys} FROM moved WHERE NOT summary
+        RETURNING 1
+    ), summarized AS (
+        INSERT INTO {table} (created_at, summary, {keys})
+        SELECT :horizon, true, {summary_keys}
+        FROM moved
+        {grouping}
+        HAVING COUNT(*) > 0 AND ({nonzero})
+        RETURNING {", ".join(columns)}
+    )
+    SELECT (SELECT COUNT(*) FROM moved) AS moved,
+           (SELECT COUNT(*) FROM archived) AS archived,
+           (SELECT ARRAY[{totals}] FROM moved) AS moved_totals,
+           (SELECT ARRAY[{totals}] FROM summarized) AS summary_totals
+    """
+
+
+def _run_compaction(engine, table, statement, params):
+    with engine.begin() as connection:
+        if table == "potion_ledger":
+            # take the balance rows in potion id order, as checkout does, so the triggers can't deadlock with it
+            connection.execute(sqlalchemy.text("SELECT potion_id FROM potion_balances ORDER BY potion_id FOR UPDATE"))
+        result = connection.execute(sqlalchemy.text(statement), params).fetchone()
+        # the triggers subtract what was moved and add what was summarized, so these must match
+        if result.moved_totals != result.summary_totals:
+            raise RuntimeError(f"compacting {table} would change the balances, rolled back")
+    return result
+
+
+def compact(engine, horizon, batch_size=50000):
+    """
+    Archive every ledger row created before `horizon`, batch_size rows per
+    transaction. Returns {ledger: rows archived}.
+    """
+    archived = {}
+    for table, spec in LEDGERS.items():
+        archived[table] = 0
+        statement = _compact_statement(table, spec["group_by"], spec["columns"], "created_at < :horizon", limited=True)
+        while True:
+            result = _run_compaction(engine, table, statement, {"horizon": horizon, "batch_size": batch_size})
+            archived[table] += result.archived
+            if result.moved < batch_size:
+                break
+
+        # each batch left its own summary rows; fold them, and older ones, into one
+        fold = _compact_statement(table, spec["group_by"], spec["columns"], "summary AND created_at <= :horizon", limited=False)
+        _run_compaction(engine, table, fold, {"horizon": horizon})
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old ledger rows behind summary rows.")
+    parser.add_argument("--older-than-days", type=float, required=True, help="archive rows older than this")
+    parser.add_argument("--batch-size", type=int, default=50000, help="rows moved per transaction")
+    parser.add_argument("--database-url", help="defaults to POSTGRES_URI")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = sqlalchemy.create_engine(args.database_url)
+    else:
+        from src import database as db
+        engine = db.get_engine()
+
+    horizon = datetime.now(timezone.utc) - timedelta(days=args.older_than_days)
+    for table, count in compact(engine, horizon, args.batch_size).items():
+        print(f"{table}: archived {count} rows older than {horizon.isoformat()}")
+
+
+if __name__ == "__main__":
+    main()
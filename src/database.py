@@ -1,10 +1,389 @@
+import asyncio
 import os
-import dotenv
-from sqlalchemy import create_engine
+import threading
+import time
+from contextlib import contextmanager
+from src import log, metrics
+from src.storage.memory import MemoryDatabase, MemoryStore
 
-def database_connection_url():
-    dotenv.load_dotenv()
+logger = log.get_logger("database")
 
+def database_connection_url():
     return os.environ.get("POSTGRES_URI")
 
-engine = create_engine(database_connection_url(), pool_pre_ping=True)
\ No newline at end of file
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+# STORAGE_BACKEND picks where the shop is kept:
+#   postgres  the database at POSTGRES_URI (the default)
+#   memory    in this process, see src/storage/memory.py; nothing is kept
+#             across restarts and POSTGRES_URI is not needed
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "postgres")
+
+# Pool sizing is read from the environment so it can be tuned per deployment:
+#   DB_POOL_SIZE       connections kept open (default 5)
+#   DB_MAX_OVERFLOW    extra connections allowed under burst (default 10)
+#   DB_POOL_TIMEOUT    seconds to wait for a free connection (default 30)
+#   DB_POOL_RECYCLE    seconds before a connection is replaced, -1 for never (default -1)
+#   DB_POOL_PRE_PING   ping on every checkout (default true); with it off, set
+#                      DB_POOL_RECYCLE below the server's idle timeout instead
+connection_url = database_connection_url()
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", -1))
+POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", True)
+
+memory_database = MemoryDatabase() if STORAGE_BACKEND == "memory" else None
+
+# The engine, and SQLAlchemy and the driver with it, are only loaded when the
+# first request needs the database, so a cold start that serves the catalog
+# from cache, /metrics or / never pays for them.
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from sqlalchemy import create_engine
+
+                _engine = create_engine(
+                    connection_url,
+                    pool_size=POOL_SIZE,
+                    max_overflow=MAX_OVERFLOW,
+                    pool_timeout=POOL_TIMEOUT,
+                    pool_recycle=POOL_RECYCLE,
+                    pool_pre_ping=POOL_PRE_PING,
+                )
+                metrics.instrument(_engine)
+    return _engine
+
+_wait_lock = threading.Lock()
+_wait_stats = {"acquired": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+def get_store():
+    """
+    FastAPI dependency that hands each request a single store (on Postgres,
+    over one pooled connection). Handlers that write call store.commit()
+    before returning; anything left uncommitted when the request ends is
+    rolled back.
+    """
+    if memory_database is not None:
+        store = MemoryStore(memory_database)
+        try:
+            yield store
+        finally:
+            store.rollback()
+        return
+
+    from src.storage.postgres import PostgresStore
+
+    start = time.perf_counter()
+    with get_engine().connect() as connection:
+        waited = time.perf_counter() - start
+        with _wait_lock:
+            _wait_stats["acquired"] += 1
+            _wait_stats["wait_seconds_total"] += waited
+            _wait_stats["wait_seconds_max"] = max(_wait_stats["wait_seconds_max"], waited)
+        yield PostgresStore(connection, on_commit=note_write)
+
+@contextmanager
+def session():
+    """A store in its own transaction, committed when the block ends and rolled back if it raises."""
+    if memory_database is not None:
+        store = MemoryStore(memory_database)
+        try:
+            yield store
+        except BaseException:
+            store.rollback()
+            raise
+        store.commit()
+        return
+
+    from src.storage.postgres import PostgresStore
+
+    with get_engine().begin() as connection:
+        yield PostgresStore(connection)
+    note_write()
+
+async def run_async(work, *args):
+    """
+    Run work(store, *args) in its own transaction from an async handler and
+    return what it returns. On Postgres this uses the asyncio engine.
+    """
+    if memory_database is not None:
+        return await asyncio.to_thread(_run_in_session, work, args)
+
+    async with get_async_engine().begin() as connection:
+        result = await connection.run_sync(_run_on_connection, work, *args)
+    note_write()
+    return result
+
+def _run_in_session(work, args):
+    with session() as store:
+        return work(store, *args)
+
+def _run_on_connection(connection, work, *args):
+    from src.storage.postgres import PostgresStore
+
+    return work(PostgresStore(connection), *args)
+
+def pool_status():
+    """Snapshot of the pool for sizing: checked out, overflow and checkout wait times."""
+    if memory_database is not None:
+        return {"storage_backend": STORAGE_BACKEND}
+    pool = get_engine().pool
+    with _wait_lock:
+        stats = dict(_wait_stats)
+    with _replica_lock:
+        replica = dict(_replica_stats)
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": MAX_OVERFLOW,
+        "connections_acquired": stats["acquired"],
+        "wait_seconds_total": round(stats["wait_seconds_total"], 6),
+        "wait_seconds_max": round(stats["wait_seconds_max"], 6),
+        "read_replica": bool(READ_REPLICA_URI),
+        **replica,
+    }
+
+# Opt-in asyncio mode: when ASYNC_DB is set the server mounts the async
+# carts, catalog and inventory routes, which run on an asyncpg engine.
+ASYNC_DB = env_flag("ASYNC_DB")
+
+_async_engine = None
+
+def async_database_connection_url(url=None):
+    url = url or connection_url
+    scheme, rest = url.split("://", 1)
+    return f"postgresql+asyncpg://{rest}" if scheme.startswith("postgres") else url
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        _async_engine = create_async_engine(
+            async_database_connection_url(),
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=POOL_PRE_PING,
+        )
+        metrics.instrument(_async_engine.sync_engine)
+    return _async_engine
+
+# Read replica. The read-only endpoints (the catalog, cart search, the audit
+# and the bottling and barrel plans) take their store from get_read_store,
+# read_session() or run_read_async() instead, so storefront polling doesn't
+# compete with checkouts for the primary. Everything else stays on the primary.
+#   READ_REPLICA_URI                database the reads go to; unset, they go to the primary
+#   READ_REPLICA_MAX_LAG_SECONDS    staleness allowed (default 1). Reads go to the primary
+#                                   while the replica is further behind than this, and for
+#                                   this long after this process commits a write, so a
+#                                   client reads what it just wrote
+#   READ_REPLICA_CHECK_SECONDS      how often the replica's lag is measured (default 1)
+#   READ_REPLICA_RETRY_SECONDS      how long reads stay on the primary after the replica
+#                                   fails to connect or answer (default 5)
+# The read engines share the primary's pool settings and open their
+# connections read-only, so a write routed to the replica by mistake fails
+# instead of landing on the wrong database.
+READ_REPLICA_URI = os.environ.get("READ_REPLICA_URI")
+REPLICA_MAX_LAG = float(os.environ.get("READ_REPLICA_MAX_LAG_SECONDS", 1))
+REPLICA_CHECK_SECONDS = float(os.environ.get("READ_REPLICA_CHECK_SECONDS", 1))
+REPLICA_RETRY_SECONDS = float(os.environ.get("READ_REPLICA_RETRY_SECONDS", 5))
+
+# seconds since the replica last replayed a change, 0 when it has replayed
+# everything it received or is not a standby at all. Only a streaming
+# (physical) standby reports replay lag: a logical subscriber or any other
+# database that is not in recovery always reads as 0, so for those only the
+# write window and connection failures move reads back to the primary.
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+_read_engine = None
+_async_read_engine = None
+_replica_lock = threading.Lock()
+_replica = {"lag": 0.0, "checked_at": float("-inf"), "down_until": float("-inf")}
+_replica_stats = {"reads_replica": 0, "reads_primary": 0, "replica_fallbacks": 0, "replica_lag_seconds": 0.0}
+_last_write = float("-inf")
+
+def note_write():
+    """Record that this process just committed a write, which keeps its reads on the primary for a while."""
+    global _last_write
+    _last_write = time.monotonic()
+
+def get_read_engine():
+    global _read_engine
+    if _read_engine is None:
+        with _engine_lock:
+            if _read_engine is None:
+                from sqlalchemy import create_engine
+
+                _read_engine = create_engine(
+                    READ_REPLICA_URI,
+                    pool_size=POOL_SIZE,
+                    max_overflow=MAX_OVERFLOW,
+                    pool_timeout=POOL_TIMEOUT,
+                    pool_recycle=POOL_RECYCLE,
+                    pool_pre_ping=POOL_PRE_PING,
+                    execution_options={"postgresql_readonly": True},
+                )
+                metrics.instrument(_read_engine)
+    return _read_engine
+
+def get_async_read_engine():
+    global _async_read_engine
+    if _async_read_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        _async_read_engine = create_async_engine(
+            async_database_connection_url(READ_REPLICA_URI),
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=POOL_PRE_PING,
+            execution_options={"postgresql_readonly": True},
+        )
+        metrics.instrument(_async_read_engine.sync_engine)
+    return _async_read_engine
+
+def _replica_allowed():
+    """Whether the staleness policy lets the next read try the replica, and whether its lag is due a check."""
+    if not READ_REPLICA_URI:
+        return False, False
+    now = time.monotonic()
+    if now - _last_write < REPLICA_MAX_LAG:
+        return False, False
+    with _replica_lock:
+        if now < _replica["down_until"]:
+            return False, False
+        return True, now - _replica["checked_at"] >= REPLICA_CHECK_SECONDS
+
+def _check_lag(connection):
+    import sqlalchemy
+
+    lag = float(connection.execute(sqlalchemy.text(REPLICA_LAG_SQL)).scalar())
+    with _replica_lock:
+        _replica["lag"] = lag
+        _replica["checked_at"] = time.monotonic()
+        _replica_stats["replica_lag_seconds"] = round(lag, 3)
+
+def _replica_fresh():
+    with _replica_lock:
+        return _replica["lag"] <= REPLICA_MAX_LAG
+
+def _replica_failed(e):
+    with _replica_lock:
+        _replica["down_until"] = time.monotonic() + REPLICA_RETRY_SECONDS
+        _replica_stats["replica_fallbacks"] += 1
+    logger.warning("read replica unavailable, reading from the primary", error=str(e), retry_seconds=REPLICA_RETRY_SECONDS)
+
+def _count_read(on_replica):
+    with _replica_lock:
+        _replica_stats["reads_replica" if on_replica else "reads_primary"] += 1
+
+def _open_replica():
+    """A connection to the replica if the staleness policy allows one right now, otherwise None."""
+    allowed, check = _replica_allowed()
+    if not allowed:
+        return None
+    connection = None
+    try:
+        connection = get_read_engine().connect()
+        if check:
+            _check_lag(connection)
+    except Exception as e:
+        if connection is not None:
+            connection.close()
+        _replica_failed(e)
+        return None
+    if not _replica_fresh():
+        connection.close()
+        return None
+    return connection
+
+async def _open_async_replica():
+    allowed, check = _replica_allowed()
+    if not allowed:
+        return None
+    connection = None
+    try:
+        connection = await get_async_read_engine().connect()
+        if check:
+            await connection.run_sync(_check_lag)
+    except Exception as e:
+        if connection is not None:
+            await connection.close()
+        _replica_failed(e)
+        return None
+    if not _replica_fresh():
+        await connection.close()
+        return None
+    return connection
+
+@contextmanager
+def _read_connection():
+    connection = _open_replica()
+    _count_read(connection is not None)
+    if connection is None:
+        connection = get_engine().connect()
+    with connection:
+        yield connection
+
+def get_read_store():
+    """
+    FastAPI dependency like get_store, for handlers that only read. The store
+    is on the replica when the staleness policy allows and on the primary
+    otherwise. Nothing it does is committed.
+    """
+    if memory_database is not None:
+        yield from get_store()
+        return
+
+    from src.storage.postgres import PostgresStore
+
+    with _read_connection() as connection:
+        yield PostgresStore(connection)
+
+@contextmanager
+def read_session():
+    """A store for reading only, routed like get_read_store."""
+    if memory_database is not None:
+        with session() as store:
+            yield store
+        return
+
+    from src.storage.postgres import PostgresStore
+
+    with _read_connection() as connection:
+        yield PostgresStore(connection)
+
+async def run_read_async(work, *args):
+    """Run work(store, *args), which only reads, from an async handler, routed like get_read_store."""
+    if memory_database is not None:
+        return await run_async(work, *args)
+
+    connection = await _open_async_replica()
+    _count_read(connection is not None)
+    if connection is None:
+        connection = await get_async_engine().connect()
+    try:
+        return await connection.run_sync(_run_on_connection, work, *args)
+    finally:
+        await connection.close()
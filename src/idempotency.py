@@ -0,0 +1,32 @@
+# Deduplicates the delivery endpoints on (endpoint, order_id). A delivery
+# claims its key in processed_deliveries inside the same transaction as its
+# ledger writes, so a retry either finds the stored response or waits on the
+# primary key until the first attempt commits or rolls back. There is no
+# in-process cache in front of the table: /admin/reset on any instance clears
+# it for a new game, which reuses order ids, and only the database sees that.
+#
+#     previous = idempotency.claim(store, "barrels", order_id)
+#     if previous is not None:
+#         return previous
+#     ... ledger writes ...
+#     idempotency.complete(store, "barrels", order_id, response)
+
+
+def claim(store, endpoint, order_id):
+    """
+    Claim (endpoint, order_id) in the current transaction. Returns the earlier
+    response if the delivery was already processed, or None if the caller
+    should go ahead and apply it.
+    """
+    claimed, response = store.claim_delivery(endpoint, order_id)
+    if claimed:
+        return None
+
+    if response is None:
+        response = {"status": "success", "message": "Delivery already processed"}
+    return response
+
+
+def complete(store, endpoint, order_id, response):
+    """Store the response for a claimed delivery, in the same transaction as its writes."""
+    store.complete_delivery(endpoint, order_id, response)
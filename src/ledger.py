@@ -0,0 +1,83 @@
+import sqlalchemy
+from src.storage.base import COLORS
+
+# Current balances are read from ledger_balances and potion_balances, which
+# triggers keep in step with gold_ledger, ml_ledger and potion_ledger
+# (see migrations/0002_ledger_balances.sql). Reads cost the same no matter how
+# long the ledgers get.
+
+
+def get_balances(connection):
+    """
+    Current gold, total potions and ml per color, read in a single statement.
+    Every value is an int: SUM over a bigint is numeric in Postgres, which
+    comes back as a Decimal that orjson can't serialize, so it is cast back.
+    """
+    sql = """
+    SELECT b.gold, b.red_ml, b.green_ml, b.blue_ml, b.dark_ml,
+           (SELECT CAST(COALESCE(SUM(quantity), 0) AS bigint) FROM potion_balances) AS potions
+    FROM ledger_balances b
+    WHERE b.id = 1
+    """
+    row = connection.execute(sqlalchemy.text(sql)).fetchone()
+    if row is None:
+        return {"gold": 0, "potions": 0, "ml": {color: 0 for color in COLORS}}
+
+    return {
+        "gold": row.gold or 0,
+        "potions": row.potions or 0,
+        "ml": {
+            "red": row.red_ml or 0,
+            "green": row.green_ml or 0,
+            "blue": row.blue_ml or 0,
+            "dark": row.dark_ml or 0,
+        },
+    }
+
+
+def get_potions_in_stock(connection):
+    """Every potion with a positive balance, joined with its catalog info."""
+    sql = """
+    SELECT p.id, p.name, p.sku, p.price, pb.quantity,
+           p.red, p.green, p.blue, p.dark
+    FROM potion_balances pb
+    JOIN potions p ON p.id = pb.potion_id
+    WHERE pb.quantity > 0
+    """
+    return connection.execute(sqlalchemy.text(sql)).fetchall()
+
+
+def record_gold(connection, quantity_change):
+    connection.execute(
+        sqlalchemy.text("INSERT INTO gold_ledger (quantity_change) VALUES (:quantity_change)"),
+        {"quantity_change": quantity_change}
+    )
+
+
+def record_ml(connection, ml_changes):
+    """Write one ml_ledger row for a dict of ml changes keyed by color."""
+    sql = """
+    INSERT INTO ml_ledger (red_change, green_change, blue_change, dark_change)
+    VALUES (:red_change, :green_change, :blue_change, :dark_change)
+    """
+    connection.execute(sqlalchemy.text(sql), {
+        f"{color}_change": ml_changes.get(color, 0) for color in COLORS
+    })
+
+
+def record_potions(connection, potion_changes):
+    """
+    Write a potion_ledger row for every (potion_id, quantity_change) pair
+    with a single multi-row insert.
+    """
+    if not potion_changes:
+        return
+
+    sql = """
+    INSERT INTO potion_ledger (potion_id, quantity_change)
+    SELECT * FROM unnest(CAST(:potion_ids AS bigint[]), CAST(:quantity_changes AS int[]))
+    """
+    potion_ids, quantity_changes = (list(column) for column in zip(*potion_changes))
+    connection.execute(sqlalchemy.text(sql), {
+        "potion_ids": potion_ids, "quantity_changes": quantity_changes
+    })
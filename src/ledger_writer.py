@@ -0,0 +1,137 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from src import database as db
+
+# Runs the ledger-writing units of work (deliveries and checkout). Each unit
+# is a function work(store, *args) that does its writes without committing
+# and returns the response.
+#
+# LEDGER_WRITER picks how units are committed:
+#   direct  each request commits its own transaction (the default)
+#   group   requests hand their unit to one writer thread, which runs every
+#           unit that arrives within LEDGER_GROUP_WINDOW_MS (default 2) of
+#           the first, up to LEDGER_GROUP_MAX (default 256), in one
+#           transaction with one commit. Each unit runs in its own savepoint,
+#           so a failing unit rolls back alone and its request gets the
+#           error. Requests wait for the group commit before responding, so
+#           a response still means the writes are committed.
+#
+# LEDGER_SYNCHRONOUS_COMMIT (default true) is the durability knob for group
+# mode. Turning it off commits each group with synchronous_commit = off:
+# requests return before the commit reaches disk, and a database crash can
+# lose the last few hundred milliseconds of acknowledged writes
+# (up to 3 x wal_writer_delay). The ledgers and balances stay consistent
+# with each other either way.
+#
+# Group mode is for Postgres. With STORAGE_BACKEND=memory every unit runs
+# direct, since there is no commit to share.
+
+MODE = os.environ.get("LEDGER_WRITER", "direct")
+GROUP_WINDOW = float(os.environ.get("LEDGER_GROUP_WINDOW_MS", 2)) / 1000
+GROUP_MAX = int(os.environ.get("LEDGER_GROUP_MAX", 256))
+SYNCHRONOUS_COMMIT = db.env_flag("LEDGER_SYNCHRONOUS_COMMIT", True)
+
+_queue = queue.Queue()
+_lock = threading.Lock()
+_thread = None
+_stats = {"groups": 0, "units": 0}
+
+
+def run(work, *args):
+    """Run work(store, *args) and commit it. Returns what work returns."""
+    if MODE != "group" or db.memory_database is not None:
+        with db.session() as store:
+            return work(store, *args)
+    return _submit(work, args).result()
+
+
+async def run_async(work, *args):
+    """run() for async handlers; direct mode uses the asyncio engine."""
+    if MODE != "group" or db.memory_database is not None:
+        return await db.run_async(work, *args)
+    return await asyncio.wrap_future(_submit(work, args))
+
+
+def stats():
+    """Groups committed and units they carried, for sizing the window."""
+    with _lock:
+        return dict(_stats)
+
+
+def stop():
+    """Commit whatever is queued and stop the writer thread."""
+    global _thread
+    with _lock:
+        thread, _thread = _thread, None
+    if thread is not None:
+        _queue.put(None)
+        thread.join()
+
+
+def _submit(work, args):
+    global _thread
+    future = Future()
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_write_groups, name="ledger-writer", daemon=True)
+            _thread.start()
+        _queue.put((work, args, future))
+    return future
+
+
+def _write_groups():
+    stopping = False
+    while not stopping:
+        unit = _queue.get()
+        if unit is None:
+            return
+        group = [unit]
+        deadline = time.monotonic() + GROUP_WINDOW
+        while len(group) < GROUP_MAX:
+            try:
+                unit = _queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if unit is None:
+                stopping = True
+                break
+            group.append(unit)
+        _commit_group(group)
+
+
+def _commit_group(group):
+    import sqlalchemy
+    from src.storage.postgres import PostgresStore
+
+    results = []
+    try:
+        with db.get_engine().begin() as connection:
+            if not SYNCHRONOUS_COMMIT:
+                connection.execute(sqlalchemy.text("SET LOCAL synchronous_commit = off"))
+            for work, args, future in group:
+                savepoint = connection.begin_nested()
+                try:
+                    result = work(PostgresStore(connection), *args)
+                except Exception as e:
+                    savepoint.rollback()
+                    future.set_exception(e)
+                    continue
+                savepoint.commit()
+                results.append((future, result))
+    except Exception as e:
+        # the group's commit failed, so nothing in it was written
+        for _, _, future in group:
+            if not future.done():
+                future.set_exception(e)
+        return
+
+    db.note_write()
+    with _lock:
+        _stats["groups"] += 1
+        _stats["units"] += len(group)
+    for future, result in results:
+        future.set_result(result)
@@ -0,0 +1,102 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+# Structured logging for the handlers and planners. Each call logs an event
+# name and keyword fields, written as one JSON object per line:
+#
+#     logger = log.get_logger("bottler")
+#     logger.debug("bottle plan", plan=final_bottle_plan, strategy=strategy.value)
+#
+# LOG_LEVEL (default WARNING) sets the level, so the debug and info events
+# are off unless asked for. LOG_SAMPLE_RATE (default 1.0) keeps that share of
+# debug and info events; warnings and errors are always kept. Events that are
+# filtered out return before any field is formatted. The rest go on a queue
+# and are serialized and written by a background thread, so handlers never
+# wait on stdout.
+
+LEVEL = os.environ.get("LOG_LEVEL", "WARNING").upper()
+SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+
+_root = logging.getLogger("cauldrons")
+_root.setLevel(LEVEL)
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _EnqueueRecord(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # serialization happens on the listener thread, not in the request
+        return record
+
+
+class StructuredLogger:
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _log(self, level, event, fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING and SAMPLE_RATE < 1.0 and random.random() >= SAMPLE_RATE:
+            return
+        # copy containers so later changes by the caller don't leak into the queued event
+        exc_info = fields.pop("exc_info", None)
+        fields = {key: value.copy() if isinstance(value, (dict, list)) else value for key, value in fields.items()}
+        self._logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+
+def get_logger(name):
+    """Structured logger for a module, e.g. get_logger("carts")."""
+    return StructuredLogger(_root.getChild(name))
+
+
+def configure():
+    """Send every logger's events through the queue to stdout. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _root.addHandler(_EnqueueRecord(log_queue))
+    _root.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+
+def shutdown():
+    """Write out queued events and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
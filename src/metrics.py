@@ -0,0 +1,128 @@
+import contextvars
+import threading
+import time
+
+# In-process request and query metrics, rendered in the Prometheus text
+# format by GET /metrics. The middleware in server.py calls start_request()
+# and finish_request() around every request; the cursor hooks that
+# instrument() puts on the server's engines charge each SQL statement to the
+# request that ran it, which is how N+1 query patterns show up in
+# http_request_db_queries. Statements run outside a request (the
+# group-commit writer thread) only count towards the db_* totals.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+METRICS = {
+    "http_requests_total": ("counter", "Requests served, by route and status."),
+    "http_request_duration_seconds": ("histogram", "Request latency, by route."),
+    "http_request_db_queries": ("histogram", "SQL statements run per request, by route."),
+    "http_request_db_seconds_total": ("counter", "Time spent in SQL statements, by route."),
+    "db_queries_total": ("counter", "SQL statements run by the process."),
+    "db_query_seconds_total": ("counter", "Time spent in SQL statements by the process."),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def _inc(name, labels, amount=1):
+    key = (name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def _observe(name, labels, value, buckets):
+    key = (name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram["counts"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def start_request():
+    """Start counting SQL statements for the current request."""
+    _request_stats.set({"queries": 0, "db_seconds": 0.0})
+
+
+def finish_request(method, route, status, seconds):
+    """Record a finished request and the SQL it ran."""
+    stats = _request_stats.get() or {"queries": 0, "db_seconds": 0.0}
+    labels = (("method", method), ("route", route))
+    _inc("http_requests_total", labels + (("status", str(status)),))
+    _observe("http_request_duration_seconds", labels, seconds, LATENCY_BUCKETS)
+    _observe("http_request_db_queries", labels, stats["queries"], QUERY_COUNT_BUCKETS)
+    _inc("http_request_db_seconds_total", labels, stats["db_seconds"])
+
+
+def instrument(engine):
+    """Count and time every statement run on a (sync) engine."""
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started_at"].pop()
+    seconds = time.perf_counter() - started
+    _inc("db_queries_total", ())
+    _inc("db_query_seconds_total", (), seconds)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats["queries"] += 1
+        stats["db_seconds"] += seconds
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_started_at"):
+        context.connection.info["query_started_at"].pop()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: dict(value, counts=list(value["counts"])) for key, value in _histograms.items()}
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            continue
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,95 @@
+"""
+Apply the versioned SQL migrations in migrations/ to a Postgres database.
+
+Migrations are files named NNNN_description.sql and run in version order.
+Each one runs in its own transaction and is recorded in schema_migrations,
+so running this again only applies what is new.
+
+    python -m src.migrate                      # apply everything pending to POSTGRES_URI
+    python -m src.migrate --list               # show applied and pending versions
+    python -m src.migrate --target 0002        # stop after version 0002
+    python -m src.migrate --database-url postgresql+psycopg2://...
+"""
+import argparse
+import pathlib
+import re
+import sqlalchemy
+
+MIGRATIONS_DIR = pathlib.Path(__file__).resolve().parent.parent / "migrations"
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+
+def available_migrations():
+    """Every migration on disk as (version, name, path), in version order."""
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        match = MIGRATION_FILE.match(path.name)
+        if match:
+            migrations.append((match.group(1), match.group(2), path))
+    return migrations
+
+
+def applied_versions(connection):
+    connection.execute(sqlalchemy.text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version text PRIMARY KEY,
+            name text NOT NULL,
+            applied_at timestamptz NOT NULL DEFAULT now()
+        )
+    """))
+    result = connection.execute(sqlalchemy.text("SELECT version FROM schema_migrations"))
+    return {row.version for row in result}
+
+
+def migrate(engine, target=None):
+    """Apply pending migrations up to and including `target`. Returns the versions applied."""
+    with engine.begin() as connection:
+        applied = applied_versions(connection)
+
+    newly_applied = []
+    for version, name, path in available_migrations():
+        if target is not None and version > target:
+            break
+        if version in applied:
+            continue
+
+        with engine.begin() as connection:
+            # no_parameters keeps the driver from treating % in the SQL as placeholders
+            connection.exec_driver_sql(path.read_text(), execution_options={"no_parameters": True})
+            connection.execute(
+                sqlalchemy.text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                {"version": version, "name": name}
+            )
+        print(f"applied {version}_{name}")
+        newly_applied.append(version)
+
+    return newly_applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply database migrations.")
+    parser.add_argument("--database-url", help="defaults to POSTGRES_URI")
+    parser.add_argument("--target", help="last migration version to apply")
+    parser.add_argument("--list", action="store_true", help="list migrations without applying them")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = sqlalchemy.create_engine(args.database_url)
+    else:
+        from src import database as db
+        engine = db.get_engine()
+
+    if args.list:
+        with engine.begin() as connection:
+            applied = applied_versions(connection)
+        for version, name, _ in available_migrations():
+            status = "applied" if version in applied else "pending"
+            print(f"{version}_{name}: {status}")
+        return
+
+    if not migrate(engine, args.target):
+        print("database is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import math
+import os
+from enum import Enum
+
+# Barrel purchase planners. Each takes the wholesale catalog (objects with
+# sku, ml_per_barrel, potion_type, price and quantity), the gold available,
+# the current ml per color and the ml capacity, and returns a list of
+# (sku, quantity) to buy.
+
+COLORS = ("red", "green", "blue", "dark")
+
+# the gold dimension of the knapsack is coarsened to at most this many buckets
+MAX_GOLD_BUCKETS = 4096
+
+
+class Strategy(str, Enum):
+    greedy = "greedy"
+    knapsack = "knapsack"
+
+
+DEFAULT_STRATEGY = Strategy(os.environ.get("BARREL_PLANNER", Strategy.knapsack.value))
+
+
+def barrel_color(barrel):
+    """Color name for a single-color barrel, or None for anything else."""
+    potion_type = list(barrel.potion_type)
+    if len(potion_type) != 4 or sorted(potion_type) != [0, 0, 0, 1]:
+        return None
+    return COLORS[potion_type.index(1)]
+
+
+def plan(strategy, wholesale_catalog, gold, current_ml, max_allowed_ml, demand=None):
+    """
+    Plan with `strategy`. knapsack splits the capacity by `demand`, the
+    projected ml per color (see sales.color_weights); greedy ignores it.
+    """
+    if strategy == Strategy.knapsack:
+        return plan_knapsack(wholesale_catalog, gold, current_ml, max_allowed_ml, demand)
+    return plan_greedy(wholesale_catalog, gold, current_ml, max_allowed_ml)
+
+
+def plan_greedy(wholesale_catalog, gold, current_ml, max_allowed_ml):
+    """
+    Buy one of each barrel, cheapest ml first, until every color reaches an
+    even share of the ml capacity or gold runs out.
+    """
+    # group barrels by type and sort by cost efficiency (price per ml)
+    type_dict = {}
+    for barrel in wholesale_catalog:
+        type_dict.setdefault(tuple(barrel.potion_type), []).append(barrel)
+    for barrels in type_dict.values():
+        barrels.sort(key=lambda x: x.price / x.ml_per_barrel)
+
+    purchase_plan = []
+    total_ml = dict(current_ml)
+
+    # calculate target ml for each type to aim for even distribution up to allowed capacity
+    target_ml = {color: min(max_allowed_ml // 4, max_allowed_ml - sum(total_ml.values())) for color in total_ml}
+
+    # prioritize purchasing barrels from different types with the best price/ml
+    for type_key in sorted(type_dict.keys(), key=lambda k: type_dict[k][0].price / type_dict[k][0].ml_per_barrel):
+        type_name = ['red', 'green', 'blue', 'dark'][type_key.index(1)]
+        for barrel in type_dict[type_key]:
+            if gold < barrel.price or total_ml[type_name] >= target_ml[type_name]:
+                continue
+            if total_ml[type_name] + barrel.ml_per_barrel <= target_ml[type_name]:
+                purchase_plan.append((barrel.sku, 1))
+                gold -= barrel.price
+                total_ml[type_name] += barrel.ml_per_barrel
+
+    return purchase_plan
+
+
+def plan_knapsack(wholesale_catalog, gold, current_ml, max_allowed_ml, demand=None):
+    """
+    Solve the purchase as a bounded knapsack: buy any number of each barrel,
+    up to the catalog quantity, to maximize demand-weighted ml without
+    spending more than `gold` or going over `max_allowed_ml`.
+
+    `demand` maps colors to relative weights and defaults to equal. Each
+    color may fill its demand share of the capacity. For each color, a
+    min-cost knapsack over ml finds the cheapest way to reach every ml
+    level. A multiple-choice knapsack over gold then picks one level per
+    color.
+    """
+    import numpy as np
+
+    demand = demand or {color: 1 for color in COLORS}
+    total_demand = sum(max(demand.get(color, 0), 0) for color in COLORS)
+    free_ml = max_allowed_ml - sum(current_ml.values())
+    if total_demand <= 0 or free_ml <= 0 or gold <= 0:
+        return []
+
+    # ml each color may still take, scaled so the colors together fit in the free capacity
+    caps = {
+        color: max(0, int(max_allowed_ml * max(demand.get(color, 0), 0) / total_demand) - current_ml.get(color, 0))
+        for color in COLORS
+    }
+    if sum(caps.values()) > free_ml:
+        scale = free_ml / sum(caps.values())
+        caps = {color: int(cap * scale) for color, cap in caps.items()}
+
+    by_color = {color: [] for color in COLORS}
+    for barrel in wholesale_catalog:
+        color = barrel_color(barrel)
+        if color and barrel.ml_per_barrel > 0 and barrel.quantity > 0 and barrel.price <= gold:
+            by_color[color].append(barrel)
+
+    color_options = {}
+    for color in COLORS:
+        if caps[color] > 0 and by_color[color] and demand.get(color, 0) > 0:
+            color_options[color] = _cheapest_ml_levels(np, by_color[color], caps[color], gold)
+    if not color_options:
+        return []
+
+    # multiple-choice knapsack over gold: pick one ml level per color
+    bucket = max(1, math.ceil(gold / MAX_GOLD_BUCKETS))
+    budget = gold // bucket
+    best_value = np.zeros(budget + 1)
+    choices = []
+    for color, (levels, costs, _) in color_options.items():
+        weight = demand[color]
+        bucket_costs = -(-costs // bucket)
+        next_value = best_value.copy()
+        choice = np.zeros(budget + 1, dtype=np.int64)
+        for option in range(1, len(levels)):
+            cost = int(bucket_costs[option])
+            if cost > budget:
+                continue
+            candidate = best_value[:budget + 1 - cost] + weight * levels[option]
+            better = candidate > next_value[cost:]
+            next_value[cost:][better] = candidate[better]
+            choice[cost:][better] = option
+        choices.append((color, choice, bucket_costs))
+        best_value = next_value
+
+    # walk the choices back from the best budget to the sku quantities
+    spend = int(best_value.argmax())
+    quantities = {}
+    for color, choice, bucket_costs in reversed(choices):
+        option = int(choice[spend])
+        spend -= int(bucket_costs[option])
+        for sku, quantity in color_options[color][2](option).items():
+            quantities[sku] = quantities.get(sku, 0) + quantity
+
+    return [(sku, quantity) for sku, quantity in quantities.items() if quantity > 0]
+
+
+def _cheapest_ml_levels(np, barrels, cap_ml, gold):
+    """
+    Bounded min-cost knapsack over ml for one color. Returns the reachable
+    ml levels worth buying, their gold cost, and a function that turns a
+    level index back into sku quantities.
+    """
+    unit = 0
+    for barrel in barrels:
+        unit = math.gcd(unit, barrel.ml_per_barrel)
+    max_units = cap_ml // unit
+    if max_units == 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64), lambda option: {}
+
+    # per barrel size, only the cheapest skus that could fill the cap matter
+    by_size = {}
+    for barrel in barrels:
+        by_size.setdefault(barrel.ml_per_barrel, []).append(barrel)
+    pieces = []
+    for ml_per_barrel, same_size in by_size.items():
+        needed = max_units // (ml_per_barrel // unit)
+        for barrel in sorted(same_size, key=lambda b: b.price):
+            if needed <= 0:
+                break
+            count = min(barrel.quantity, needed, gold // max(barrel.price, 1) if barrel.price else needed)
+            needed -= count
+            # binary splitting turns a bounded item into 0/1 pieces
+            piece = 1
+            while count > 0:
+                take = min(piece, count)
+                pieces.append((barrel.sku, take, (ml_per_barrel // unit) * take, barrel.price * take))
+                count -= take
+                piece *= 2
+
+    inf = np.iinfo(np.int64).max // 4
+    min_cost = np.full(max_units + 1, inf, dtype=np.int64)
+    min_cost[0] = 0
+    taken = []
+    for _, _, units, cost in pieces:
+        if units > max_units:
+            taken.append(None)
+            continue
+        candidate = min_cost[:max_units + 1 - units] + cost
+        better = candidate < min_cost[units:]
+        min_cost[units:][better] = candidate[better]
+        taken.append(np.concatenate([np.zeros(units, dtype=bool), better]))
+
+    # keep affordable levels that are strictly cheaper than every larger level
+    cheapest_above = np.append(np.minimum.accumulate(min_cost[::-1])[::-1][1:], inf)
+    worth_buying = (min_cost <= gold) & (min_cost < cheapest_above)
+    worth_buying[0] = True
+    levels = np.flatnonzero(worth_buying)
+    costs = min_cost[levels]
+
+    def quantities(option):
+        level = int(levels[option])
+        bought = {}
+        for index in range(len(pieces) - 1, -1, -1):
+            if level == 0:
+                break
+            if taken[index] is not None and taken[index][level]:
+                sku, take, units, _ = pieces[index]
+                bought[sku] = bought.get(sku, 0) + take
+                level -= units
+        return bought
+
+    return levels * unit, costs, quantities
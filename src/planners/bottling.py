@@ -0,0 +1,168 @@
+import os
+from enum import Enum
+from src import log
+
+# Bottling planners. Each takes the ml inventory as [red, green, blue, dark],
+# the recipes as {potion_id: [red, green, blue, dark]} and the number of
+# potions there is room for, and returns {potion_id: quantity to bottle}.
+#
+# max_count, max_revenue and best_sellers are heuristics, not exact solvers:
+# they run plan_greedy with a different value per potion, and can fall a
+# potion or two short of the true best plan on small inventories.
+
+
+class Strategy(str, Enum):
+    even = "even"
+    max_count = "max_count"
+    max_revenue = "max_revenue"
+    best_sellers = "best_sellers"
+
+
+logger = log.get_logger("planners.bottling")
+
+
+DEFAULT_STRATEGY = Strategy(os.environ.get("BOTTLE_PLANNER", Strategy.even.value))
+
+
+def plan(strategy, local_inventory, potion_recipes, max_potions, prices=None, sales_weights=None):
+    """
+    Plan with `strategy`. max_revenue values potions by `prices` and
+    best_sellers by `sales_weights` (see sales.potion_weights), both
+    {potion_id: value}.
+    """
+    if strategy == Strategy.even:
+        return plan_even(local_inventory, potion_recipes, max_potions)
+    values = None
+    if strategy == Strategy.max_revenue:
+        values = prices
+    elif strategy == Strategy.best_sellers:
+        values = sales_weights
+    return plan_greedy(local_inventory, potion_recipes, max_potions, values)
+
+
+def plan_even(local_inventory, potion_recipes, max_potions):
+    """
+    Spread potions evenly across every feasible recipe, then trim counts
+    until the plan fits in the ml inventory.
+    """
+    # Calculate maximum possible potions for each type, ensuring only feasible recipes are considered
+    potion_counts = {}
+    feasible_recipes = {}
+    for potion_id, recipe in potion_recipes.items():
+        if all(local_inventory[i] >= recipe[i] for i in range(4) if recipe[i] > 0):
+            feasible_potions = min((local_inventory[i] // recipe[i] if recipe[i] > 0 else float('inf')) for i in range(4))
+            if feasible_potions > 0:
+                potion_counts[potion_id] = feasible_potions
+                feasible_recipes[potion_id] = recipe
+        else:
+            logger.debug("cannot make potion, insufficient ingredients", potion_id=potion_id)
+
+    logger.debug("feasible potion counts", potion_counts=potion_counts)
+
+    # Normalize distribution to ensure even distribution of potion types without exceeding the additional potions allowed
+    if potion_counts:
+        total_potions = sum(potion_counts.values())
+        min_possible_potions = min(potion_counts.values())
+        normalized_total = min(max_potions, total_potions)
+        evenly_distributed = normalized_total // len(potion_counts)
+        remainder = normalized_total % len(potion_counts)
+
+        for potion_id in potion_counts:
+            potion_counts[potion_id] = evenly_distributed
+
+        # Handle any remainder if the total doesn't divide evenly
+        for potion_id in sorted(potion_counts.keys(), key=lambda x: potion_counts[x], reverse=True):
+            if remainder > 0:
+                potion_counts[potion_id] += 1
+                remainder -= 1
+
+    logger.debug("normalized potion counts", potion_counts=potion_counts)
+
+    # Calculate total ML usage
+    total_used_inventory = [0, 0, 0, 0]
+    for potion_id, count in potion_counts.items():
+        recipe = feasible_recipes[potion_id]
+        for i in range(4):
+            total_used_inventory[i] += recipe[i] * count
+
+    logger.debug("ml usage before adjustment", total_used_inventory=total_used_inventory)
+
+    # Adjust potion counts to fit within the local inventory limits
+    adjusted_potion_counts = potion_counts.copy()
+    for i in range(4):
+        if total_used_inventory[i] > local_inventory[i]:
+            excess = total_used_inventory[i] - local_inventory[i]
+            logger.debug("ingredient exceeds inventory", ingredient=i, excess=excess)
+            for potion_id, count in sorted(adjusted_potion_counts.items(), key=lambda x: feasible_recipes[x[0]][i], reverse=True):
+                if feasible_recipes[potion_id][i] > 0:
+                    max_reduction = adjusted_potion_counts[potion_id]  # Max we can reduce is the current count
+                    needed_reduction = (excess + feasible_recipes[potion_id][i] - 1) // feasible_recipes[potion_id][i]  # Calculate needed reduction
+                    reduction = min(max_reduction, needed_reduction)  # Reduce by the lesser of max_reduction or needed_reduction
+                    adjusted_potion_counts[potion_id] -= reduction
+                    reduction_amount = reduction * feasible_recipes[potion_id][i]
+                    excess -= reduction_amount
+                    total_used_inventory[i] -= reduction_amount
+                    logger.debug(
+                        "reducing potion", potion_id=potion_id, reduction=reduction, reduction_ml=reduction_amount,
+                        new_count=adjusted_potion_counts[potion_id], remaining_excess=excess
+                    )
+                    if excess <= 0:
+                        break
+
+    logger.debug("adjusted potion counts", potion_counts=adjusted_potion_counts, total_used_inventory=total_used_inventory)
+
+    return adjusted_potion_counts
+
+
+def plan_greedy(local_inventory, potion_recipes, max_potions, values=None):
+    """
+    Aim for the most total value of potions bottled without going over the
+    ml inventory or `max_potions`. Every potion is worth 1 unless `values`
+    maps potion ids to a value such as price, which aims for revenue, or
+    units sold, which favors what sells.
+
+    This is a greedy heuristic for the integer program, not an exact solve:
+    it can leave a little value on the table (in random small cases, up to
+    a couple of potions against brute force). It is vectorized across all
+    recipes. Each round weights every color by how scarce it still is and
+    picks the recipe with the best value per weighted ml. It commits half of
+    what that recipe can still make, so scarce colors are kept for the
+    recipes that need them, and repeats until nothing else fits.
+    """
+    import numpy as np
+
+    potion_ids = list(potion_recipes)
+    if not potion_ids or max_potions <= 0:
+        return {}
+
+    recipe_matrix = np.array([potion_recipes[potion_id] for potion_id in potion_ids], dtype=np.int64)
+    value = np.array([values.get(potion_id, 0) if values else 1 for potion_id in potion_ids], dtype=float)
+    usable = (recipe_matrix.sum(axis=1) > 0) & (value > 0)
+    uses_color = recipe_matrix > 0
+    unbounded = np.iinfo(np.int64).max
+
+    remaining = np.array(local_inventory, dtype=np.int64)
+    capacity = max_potions
+    counts = np.zeros(len(potion_ids), dtype=np.int64)
+
+    while capacity > 0:
+        # how many more of each recipe the remaining ml and capacity allow
+        per_color = np.where(uses_color, remaining // np.maximum(recipe_matrix, 1), unbounded)
+        can_make = np.minimum(per_color.min(axis=1), capacity)
+        can_make[~usable] = 0
+        feasible = can_make > 0
+        if not feasible.any():
+            break
+
+        weighted_ml = recipe_matrix @ (1.0 / np.maximum(remaining, 1))
+        score = np.where(feasible, value / np.maximum(weighted_ml, 1e-12), -np.inf)
+        best = int(score.argmax())
+
+        batch = int(can_make[best])
+        if feasible.sum() > 1:
+            batch = (batch + 1) // 2
+        counts[best] += batch
+        remaining -= recipe_matrix[best] * batch
+        capacity -= batch
+
+    return {potion_ids[i]: int(count) for i, count in enumerate(counts) if count > 0}
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+
+# Process-wide cache of the potions table. Hot handlers map a recipe
+# (red, green, blue, dark) or sku to its potion row through here instead of
+# querying potions on every request. The cache loads lazily, expires after
+# RECIPE_CACHE_TTL seconds, and is dropped by /admin/reset and
+# /admin/invalidate_cache. Other processes pick up changes when their TTL runs out.
+
+TTL_SECONDS = float(os.environ.get("RECIPE_CACHE_TTL", 300))
+
+_lock = threading.Lock()
+_cache = None
+_loaded_at = 0.0
+# bumped by invalidate(), so a load that started before it isn't cached after it
+_generation = 0
+
+
+def _load(store):
+    rows = store.potions()
+    return {
+        "by_type": {(row.red, row.green, row.blue, row.dark): row for row in rows},
+        "by_sku": {row.sku: row for row in rows},
+        "by_id": {row.id: row for row in rows},
+    }
+
+
+def _get(store):
+    global _cache, _loaded_at
+
+    cache = _cache
+    if cache is not None and time.monotonic() - _loaded_at < TTL_SECONDS:
+        return cache
+
+    # load outside _lock: reading potions can take the memory database's
+    # lock, which a handler may already hold when it asks the cache
+    generation = _generation
+    loaded = _load(store)
+    with _lock:
+        if generation != _generation:
+            return loaded
+        if _cache is None or time.monotonic() - _loaded_at >= TTL_SECONDS:
+            _cache = loaded
+            _loaded_at = time.monotonic()
+        return _cache
+
+
+def invalidate():
+    """Drop the cached recipes so the next lookup reloads them."""
+    global _cache, _generation
+    with _lock:
+        _cache = None
+        _generation += 1
+
+
+def by_type(store, potion_type):
+    """Potion row for a (red, green, blue, dark) recipe, or None."""
+    return _get(store)["by_type"].get(tuple(potion_type))
+
+
+def by_sku(store, sku):
+    """Potion row for a sku, or None."""
+    return _get(store)["by_sku"].get(sku)
+
+
+def by_id(store, potion_id):
+    """Potion row for a potion id, or None."""
+    return _get(store)["by_id"].get(potion_id)
+
+
+def all_recipes(store):
+    """Every potion row, in no particular order."""
+    return list(_get(store)["by_id"].values())
@@ -0,0 +1,50 @@
+from src import recipes
+from src.storage.base import COLORS
+
+# Per-potion sales rolled up by game day and hour, the planners' measure of
+# what actually sells. Checkout adds each sale onto sales_rollups through
+# record(), in the same transaction as its ledger writes, at the game time
+# /info/current_time last stored in game_time. It reads that row in the same
+# transaction too, so every instance stamps sales with the same hour. Carts
+# don't record whether they were checked out, so the rollup starts at the
+# migration and can't be backfilled.
+#
+# Planners and analytics read through totals(), potion_weights() and
+# color_weights() and never touch cart_items or carts.
+
+
+def record(store, sold):
+    """Add a checkout's (potion_id, quantity, gold) sales onto the current game hour."""
+    day, hour = store.game_time()
+    store.add_sales(day, hour, sold)
+
+
+def totals(store, day=None, hour=None):
+    """
+    {potion_id: Sales(potion_id, quantity, gold)} for every potion that has
+    sold, over all game hours or only the given day and/or hour.
+    """
+    return {row.potion_id: row for row in store.sales(day, hour)}
+
+
+def potion_weights(store, day=None, hour=None):
+    """
+    Relative demand per potion, {potion_id: units sold + 1}, over the same
+    window as totals(). The extra unit keeps potions that haven't sold yet
+    in production, so they get the chance to.
+    """
+    sold = totals(store, day, hour)
+    return {
+        potion.id: (sold[potion.id].quantity if potion.id in sold else 0) + 1
+        for potion in recipes.all_recipes(store)
+    }
+
+
+def color_weights(store, day=None, hour=None):
+    """Relative ml demand per color: the ml each color puts into the potions, weighted by potion_weights()."""
+    weights = dict.fromkeys(COLORS, 0)
+    potions = {potion.id: potion for potion in recipes.all_recipes(store)}
+    for potion_id, weight in potion_weights(store, day, hour).items():
+        for color in COLORS:
+            weights[color] += getattr(potions[potion_id], color) * weight
+    return weights
@@ -0,0 +1,162 @@
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+# The shop's storage interface. Handlers and helper modules read and write
+# the ledgers, catalog, carts, processed deliveries, visit and sales rollups
+# through a Store, never through SQL, so the same code runs on Postgres
+# (postgres.PostgresStore) or entirely in process (memory.MemoryStore).
+#
+# A store is one transaction. Nothing it writes is visible to other stores
+# until commit(); rollback() undoes everything since the last commit. Get one
+# from database.get_store (a request dependency), database.session() or
+# database.run_async(), which commit and roll back for you. Handlers that
+# only read use database.get_read_store, read_session() or run_read_async()
+# instead, which may put the store on a read replica.
+#
+# Rows come back as objects with named fields. The namedtuples below give the
+# fields; the Postgres store returns SQLAlchemy rows with the same names.
+
+COLORS = ("red", "green", "blue", "dark")
+
+Potion = namedtuple("Potion", "id sku name price red green blue dark")
+StockedPotion = namedtuple("StockedPotion", "id name sku price quantity red green blue dark")
+Capacity = namedtuple("Capacity", "potion_capacity ml_capacity")
+CartReservation = namedtuple("CartReservation", "potion_id quantity in_stock cost")
+LineItem = namedtuple("LineItem", "id customer_name item_sku quantity cart_id line_item_total timestamp sort_value")
+Sales = namedtuple("Sales", "potion_id quantity gold")
+
+# what a search can be sorted by
+SEARCH_SORT_KEYS = ("customer_name", "item_sku", "line_item_total", "timestamp")
+
+
+class Store(ABC):
+    # ledgers
+
+    @abstractmethod
+    def balances(self):
+        """Current gold, total potions and ml per color: {"gold", "potions", "ml": {color: ml}}."""
+
+    @abstractmethod
+    def potions_in_stock(self):
+        """StockedPotion for every potion with a positive balance."""
+
+    @abstractmethod
+    def record_gold(self, quantity_change):
+        """Write one gold_ledger entry."""
+
+    @abstractmethod
+    def record_ml(self, ml_changes):
+        """Write one ml_ledger entry for a dict of ml changes keyed by color."""
+
+    @abstractmethod
+    def record_potions(self, potion_changes):
+        """Write a potion_ledger entry for every (potion_id, quantity_change) pair."""
+
+    # catalog and capacity
+
+    @abstractmethod
+    def potions(self):
+        """Every Potion, in no particular order."""
+
+    @abstractmethod
+    def capacity(self):
+        """The shop's Capacity, or None if it has no capacity row."""
+
+    @abstractmethod
+    def add_capacity(self, potion_capacity, ml_capacity):
+        """Add purchased units to both capacities."""
+
+    # carts
+
+    @abstractmethod
+    def create_cart(self, customer_name, character_class, level, created_at):
+        """Create a cart and return its id."""
+
+    @abstractmethod
+    def cart_exists(self, cart_id):
+        pass
+
+    @abstractmethod
+    def add_cart_items(self, cart_id, lines):
+        """Add (item_sku, quantity, potion_id, cost) lines to a cart."""
+
+    @abstractmethod
+    def reserve_cart(self, cart_id):
+        """
+        CartReservation for every potion in a cart, in potion id order, with
+        the quantity wanted and in stock (0 for a potion never stocked) and
+        the cost of its lines, priced when they were added. The stock is held
+        until commit or rollback, so it can't be sold twice.
+        Empty if the cart has no items or does not exist.
+        """
+
+    @abstractmethod
+    def take_cart_items(self, cart_id):
+        """Take every line of a cart out of the potion ledger."""
+
+    @abstractmethod
+    def search_line_items(self, customer_name, potion_sku, sort_key, descending, after, limit):
+        """
+        Up to `limit` LineItems whose customer name and sku contain the given
+        text (case-insensitive, "" matches everything), ordered by sort_key
+        (one of SEARCH_SORT_KEYS) and then id. `after` is None, or a
+        (comparison, sort_value, id) keyset bound where comparison is "<" or ">".
+        """
+
+    # processed deliveries
+
+    @abstractmethod
+    def claim_delivery(self, endpoint, order_id):
+        """
+        Claim (endpoint, order_id). Returns (True, None) if it is new, or
+        (False, response) with the stored response (None if there is none).
+        """
+
+    @abstractmethod
+    def complete_delivery(self, endpoint, order_id, response):
+        """Store the response for a claimed delivery."""
+
+    # visit rollups
+
+    @abstractmethod
+    def add_visits(self, rollups):
+        """Add (day, hour, character_class, level_band, visits) rows onto visit_rollups."""
+
+    # sales rollups
+
+    @abstractmethod
+    def add_sales(self, day, hour, sales):
+        """Add (potion_id, quantity, gold) sales onto sales_rollups for one game day and hour."""
+
+    @abstractmethod
+    def sales(self, day=None, hour=None):
+        """
+        Sales per potion that has sold, in potion id order, summed over every
+        game hour or only those on the given day and/or at the given hour.
+        """
+
+    # game time
+
+    @abstractmethod
+    def set_game_time(self, day, hour):
+        """Record the current game day and hour."""
+
+    @abstractmethod
+    def game_time(self):
+        """The (day, hour) last recorded by set_game_time(), or ("", -1) if there is none."""
+
+    # admin
+
+    @abstractmethod
+    def reset(self):
+        """Clear the ledgers, carts, processed deliveries, visit and sales rollups and game time, and start again with 100 gold."""
+
+    # transaction
+
+    @abstractmethod
+    def commit(self):
+        pass
+
+    @abstractmethod
+    def rollback(self):
+        pass
@@ -0,0 +1,340 @@
+import heapq
+import itertools
+import threading
+from array import array
+from collections import Counter
+from src.storage.base import COLORS, Capacity, CartReservation, LineItem, Potion, Sales, Store, StockedPotion
+
+# In-process storage for running the whole API without Postgres, so handlers
+# and planners can be profiled and benchmarked apart from database I/O.
+# Nothing survives a restart.
+#
+# The ledgers are append-only arrays of signed 64-bit changes, with running
+# balances kept alongside them the way the Postgres triggers keep
+# ledger_balances and potion_balances. Carts are dicts keyed by id, with their
+# line items indexed by cart. Lookups by sku and recipe go through the recipe
+# cache, which is built from potions() like it is on Postgres.
+#
+# Transactions are serialized: a store takes the database lock on its first
+# read or write and holds it until commit() or rollback(), so a checkout's
+# stock check and its ledger write can't interleave with another's. Every
+# write records how to undo itself, and rollback() replays those in reverse.
+
+# (sku, name, price, red, green, blue, dark) of the potions a new shop knows
+DEFAULT_POTIONS = [
+    ("RED_POTION", "red potion", 50, 100, 0, 0, 0),
+    ("GREEN_POTION", "green potion", 50, 0, 100, 0, 0),
+    ("BLUE_POTION", "blue potion", 50, 0, 0, 100, 0),
+    ("DARK_POTION", "dark potion", 65, 0, 0, 0, 100),
+    ("YELLOW_POTION", "yellow potion", 55, 50, 50, 0, 0),
+    ("PURPLE_POTION", "purple potion", 55, 50, 0, 50, 0),
+    ("TEAL_POTION", "teal potion", 55, 0, 50, 50, 0),
+    ("RAINBOW_POTION", "rainbow potion", 75, 25, 25, 25, 25),
+]
+
+
+class MemoryDatabase:
+    """The shop's state, shared by every MemoryStore opened on it."""
+
+    def __init__(self, potions=DEFAULT_POTIONS):
+        self.lock = threading.Lock()
+        self.potions = {
+            potion_id: Potion(potion_id, sku, name, price, red, green, blue, dark)
+            for potion_id, (sku, name, price, red, green, blue, dark) in enumerate(potions, start=1)
+        }
+        # a new shop starts with one unit of each capacity
+        self.capacity = [1, 1]
+        # ids keep counting across resets, like identity columns after a TRUNCATE
+        self.cart_ids = itertools.count(1)
+        self.line_item_ids = itertools.count(1)
+        self.clear()
+        self.gold_changes.append(100)
+        self.gold = 100
+
+    def clear(self):
+        """Start the ledgers, carts, processed deliveries, visit and sales rollups and game time over, empty."""
+        self.gold_changes = array("q")
+        # four changes per ml_ledger entry, in COLORS order
+        self.ml_changes = array("q")
+        self.potion_ledger_ids = array("q")
+        self.potion_ledger_changes = array("q")
+        self.gold = 0
+        self.ml = [0] * len(COLORS)
+        # potion id -> balance, for potions that have ever been in the ledger
+        self.stock = {}
+
+        # cart id -> (created_at, customer_name, character_class, level)
+        self.carts = {}
+        # cart id -> [(id, potion_id, item_sku, quantity, cost)]
+        self.cart_items = {}
+
+        # (endpoint, order_id) -> response, None until the delivery completes
+        self.deliveries = {}
+        # (day, hour, character_class, level_band) -> visits
+        self.visit_rollups = Counter()
+        # (day, hour, potion_id) -> (quantity, gold)
+        self.sales_rollups = {}
+        # (day, hour) last reported by /info/current_time
+        self.game_time = ("", -1)
+
+
+class MemoryStore(Store):
+    def __init__(self, database):
+        self.database = database
+        # undo steps for the open transaction, None when the store holds no lock
+        self._undo = None
+
+    def _begin(self):
+        if self._undo is None:
+            self.database.lock.acquire()
+            self._undo = []
+        return self.database
+
+    # ledgers
+
+    def balances(self):
+        database = self._begin()
+        return {
+            "gold": database.gold,
+            "potions": sum(database.stock.values()),
+            "ml": dict(zip(COLORS, database.ml)),
+        }
+
+    def potions_in_stock(self):
+        database = self._begin()
+        in_stock = []
+        for potion_id, quantity in database.stock.items():
+            if quantity > 0:
+                potion = database.potions[potion_id]
+                in_stock.append(StockedPotion(
+                    potion.id, potion.name, potion.sku, potion.price, quantity,
+                    potion.red, potion.green, potion.blue, potion.dark
+                ))
+        return in_stock
+
+    def record_gold(self, quantity_change):
+        database = self._begin()
+        database.gold_changes.append(quantity_change)
+        database.gold += quantity_change
+
+        def undo():
+            database.gold -= database.gold_changes.pop()
+        self._undo.append(undo)
+
+    def record_ml(self, ml_changes):
+        database = self._begin()
+        changes = [ml_changes.get(color, 0) for color in COLORS]
+        database.ml_changes.extend(changes)
+        for i, change in enumerate(changes):
+            database.ml[i] += change
+
+        def undo():
+            for i, change in enumerate(changes):
+                database.ml[i] -= change
+            del database.ml_changes[-len(changes):]
+        self._undo.append(undo)
+
+    def record_potions(self, potion_changes):
+        if not potion_changes:
+            return
+        database = self._begin()
+        for potion_id, quantity_change in potion_changes:
+            database.potion_ledger_ids.append(potion_id)
+            database.potion_ledger_changes.append(quantity_change)
+            database.stock[potion_id] = database.stock.get(potion_id, 0) + quantity_change
+
+        def undo():
+            for potion_id, quantity_change in potion_changes:
+                database.stock[potion_id] -= quantity_change
+            del database.potion_ledger_ids[-len(potion_changes):]
+            del database.potion_ledger_changes[-len(potion_changes):]
+        self._undo.append(undo)
+
+    # catalog and capacity
+
+    def potions(self):
+        return list(self._begin().potions.values())
+
+    def capacity(self):
+        return Capacity(*self._begin().capacity)
+
+    def add_capacity(self, potion_capacity, ml_capacity):
+        database = self._begin()
+        database.capacity[0] += potion_capacity
+        database.capacity[1] += ml_capacity
+
+        def undo():
+            database.capacity[0] -= potion_capacity
+            database.capacity[1] -= ml_capacity
+        self._undo.append(undo)
+
+    # carts
+
+    def create_cart(self, customer_name, character_class, level, created_at):
+        database = self._begin()
+        cart_id = next(database.cart_ids)
+        database.carts[cart_id] = (created_at, customer_name, character_class, level)
+        database.cart_items[cart_id] = []
+        self._undo.append(lambda: (database.carts.pop(cart_id), database.cart_items.pop(cart_id)))
+        return cart_id
+
+    def cart_exists(self, cart_id):
+        return cart_id in self._begin().carts
+
+    def add_cart_items(self, cart_id, lines):
+        if not lines:
+            return
+        database = self._begin()
+        items = database.cart_items[cart_id]
+        for item_sku, quantity, potion_id, cost in lines:
+            items.append((next(database.line_item_ids), potion_id, item_sku, quantity, cost))
+
+        def undo():
+            del items[-len(lines):]
+        self._undo.append(undo)
+
+    def _cart_quantities(self, cart_id):
+        quantities = Counter()
+        for _, potion_id, _, quantity, _ in self._begin().cart_items.get(cart_id, ()):
+            quantities[potion_id] += quantity
+        return quantities
+
+    def reserve_cart(self, cart_id):
+        # the database lock is already held until commit, which is the reservation
+        database = self._begin()
+        quantities, costs = Counter(), Counter()
+        for _, potion_id, _, quantity, cost in database.cart_items.get(cart_id, ()):
+            quantities[potion_id] += quantity
+            costs[potion_id] += cost
+        return [
+            CartReservation(potion_id, quantities[potion_id], database.stock.get(potion_id, 0), costs[potion_id])
+            for potion_id in sorted(quantities)
+        ]
+
+    def take_cart_items(self, cart_id):
+        quantities = self._cart_quantities(cart_id)
+        self.record_potions([(potion_id, -quantity) for potion_id, quantity in sorted(quantities.items())])
+
+    def search_line_items(self, customer_name, potion_sku, sort_key, descending, after, limit):
+        database = self._begin()
+        customer_name, potion_sku = customer_name.lower(), potion_sku.lower()
+
+        matches = []
+        for cart_id, items in database.cart_items.items():
+            created_at, name = database.carts[cart_id][:2]
+            if customer_name not in name.lower():
+                continue
+            for line_item_id, _, item_sku, quantity, cost in items:
+                if potion_sku not in item_sku.lower():
+                    continue
+                sort_value = {
+                    "customer_name": name,
+                    "item_sku": item_sku,
+                    "line_item_total": cost,
+                    "timestamp": created_at,
+                }[sort_key]
+                if after is not None:
+                    comparison, after_value, after_id = after
+                    key, bound = (sort_value, line_item_id), (after_value, after_id)
+                    if not (key < bound if comparison == "<" else key > bound):
+                        continue
+                matches.append(
+                    LineItem(line_item_id, name, item_sku, quantity, cart_id, cost, created_at, sort_value)
+                )
+
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        return pick(limit, matches, key=lambda line_item: (line_item.sort_value, line_item.id))
+
+    # processed deliveries
+
+    def claim_delivery(self, endpoint, order_id):
+        database = self._begin()
+        key = (endpoint, order_id)
+        if key in database.deliveries:
+            return False, database.deliveries[key]
+        database.deliveries[key] = None
+        self._undo.append(lambda: database.deliveries.pop(key))
+        return True, None
+
+    def complete_delivery(self, endpoint, order_id, response):
+        database = self._begin()
+        key = (endpoint, order_id)
+        previous = database.deliveries.get(key)
+        database.deliveries[key] = response
+
+        def undo():
+            database.deliveries[key] = previous
+        self._undo.append(undo)
+
+    # visit rollups
+
+    def add_visits(self, rollups):
+        database = self._begin()
+        added = Counter({(day, hour, character_class, band): visits for day, hour, character_class, band, visits in rollups})
+        database.visit_rollups.update(added)
+        self._undo.append(lambda: database.visit_rollups.subtract(added))
+
+    # sales rollups
+
+    def add_sales(self, day, hour, sales):
+        if not sales:
+            return
+        database = self._begin()
+        previous = {}
+        for potion_id, quantity, gold in sales:
+            key = (day, hour, potion_id)
+            previous.setdefault(key, database.sales_rollups.get(key))
+            sold_quantity, sold_gold = database.sales_rollups.get(key, (0, 0))
+            database.sales_rollups[key] = (sold_quantity + quantity, sold_gold + gold)
+
+        def undo():
+            for key, rollup in previous.items():
+                if rollup is None:
+                    del database.sales_rollups[key]
+                else:
+                    database.sales_rollups[key] = rollup
+        self._undo.append(undo)
+
+    def sales(self, day=None, hour=None):
+        database = self._begin()
+        quantities, gold = Counter(), Counter()
+        for (sold_day, sold_hour, potion_id), (quantity, sold_gold) in database.sales_rollups.items():
+            if (day is None or sold_day == day) and (hour is None or sold_hour == hour):
+                quantities[potion_id] += quantity
+                gold[potion_id] += sold_gold
+        return [Sales(potion_id, quantities[potion_id], gold[potion_id]) for potion_id in sorted(quantities)]
+
+    # game time
+
+    def set_game_time(self, day, hour):
+        database = self._begin()
+        previous = database.game_time
+        database.game_time = (day, hour)
+        self._undo.append(lambda: setattr(database, "game_time", previous))
+
+    def game_time(self):
+        return self._begin().game_time
+
+    # admin
+
+    def reset(self):
+        database = self._begin()
+        # clear() swaps in new containers, so the old ones can be put back as they are
+        previous = dict(vars(database))
+        database.clear()
+        self._undo.append(lambda: vars(database).update(previous))
+        self.record_gold(100)
+
+    # transaction
+
+    def commit(self):
+        if self._undo is not None:
+            self._undo = None
+            self.database.lock.release()
+
+    def rollback(self):
+        if self._undo is not None:
+            for undo in reversed(self._undo):
+                undo()
+            self._undo = None
+            self.database.lock.release()
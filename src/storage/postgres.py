@@ -0,0 +1,308 @@
+import json
+import sqlalchemy
+from src import ledger
+from src.storage.base import CartReservation, Store
+
+# Store over one SQLAlchemy connection. Balances come from the trigger-kept
+# ledger_balances and potion_balances tables (see src/ledger.py).
+
+# columns backing each search sort key, used both for ORDER BY and the keyset comparison
+SEARCH_SORT_COLUMNS = {
+    "customer_name": "cart.customer_name",
+    "item_sku": "ci.item_sku",
+    "line_item_total": "ci.cost",
+    "timestamp": "cart.created_at",
+}
+
+
+class PostgresStore(Store):
+    def __init__(self, connection, on_commit=None):
+        self.connection = connection
+        # called after every commit, so database.py can tell when this process last wrote
+        self.on_commit = on_commit
+
+    def _execute(self, sql, params=None):
+        return self.connection.execute(sqlalchemy.text(sql), params)
+
+    # ledgers
+
+    def balances(self):
+        return ledger.get_balances(self.connection)
+
+    def potions_in_stock(self):
+        return ledger.get_potions_in_stock(self.connection)
+
+    def record_gold(self, quantity_change):
+        ledger.record_gold(self.connection, quantity_change)
+
+    def record_ml(self, ml_changes):
+        ledger.record_ml(self.connection, ml_changes)
+
+    def record_potions(self, potion_changes):
+        ledger.record_potions(self.connection, potion_changes)
+
+    # catalog and capacity
+
+    def potions(self):
+        return self._execute("SELECT id, sku, name, price, red, green, blue, dark FROM potions").fetchall()
+
+    def capacity(self):
+        return self._execute("SELECT potion_capacity, ml_capacity FROM capacity LIMIT 1").fetchone()
+
+    def add_capacity(self, potion_capacity, ml_capacity):
+        self._execute("""
+            UPDATE capacity
+            SET potion_capacity = potion_capacity + :potion_capacity,
+                ml_capacity = ml_capacity + :ml_capacity
+        """, {"potion_capacity": potion_capacity, "ml_capacity": ml_capacity})
+
+    # carts
+
+    def create_cart(self, customer_name, character_class, level, created_at):
+        sql = """
+        INSERT INTO carts (created_at, character_class, customer_name, level)
+        VALUES (:created_at, :character_class, :customer_name, :level)
+        RETURNING id
+        """
+        return self._execute(sql, {
+            "created_at": created_at,
+            "character_class": character_class,
+            "customer_name": customer_name,
+            "level": level
+        }).scalar()
+
+    def cart_exists(self, cart_id):
+        return self._execute("SELECT EXISTS(SELECT 1 FROM carts WHERE id = :cart_id)", {"cart_id": cart_id}).scalar()
+
+    def add_cart_items(self, cart_id, lines):
+        if not lines:
+            return
+
+        # all lines in one multi-row insert
+        sql = """
+        INSERT INTO cart_items (cart_id, item_sku, quantity, potion_id, cost)
+        SELECT :cart_id, * FROM unnest(
+            CAST(:item_skus AS text[]), CAST(:quantities AS int[]), CAST(:potion_ids AS bigint[]), CAST(:costs AS int[])
+        )
+        """
+        item_skus, quantities, potion_ids, costs = (list(column) for column in zip(*lines))
+        self._execute(sql, {
+            "cart_id": cart_id,
+            "item_skus": item_skus,
+            "quantities": quantities,
+            "potion_ids": potion_ids,
+            "costs": costs
+        })
+
+    def reserve_cart(self, cart_id):
+        # lock the stock rows for every potion in the cart, in potion id order so
+        # concurrent checkouts for the same sku queue up instead of deadlocking.
+        # SUM over int is bigint, but over bigint it would be numeric
+        reserve_sql = """
+        SELECT items.potion_id, items.quantity, pb.quantity AS in_stock, items.cost,
+               (SELECT COUNT(DISTINCT potion_id) FROM cart_items WHERE cart_id = :cart_id) AS cart_potions
+        FROM (
+            SELECT potion_id, SUM(quantity) AS quantity, SUM(cost) AS cost
+            FROM cart_items
+            WHERE cart_id = :cart_id
+            GROUP BY potion_id
+        ) items
+        JOIN potion_balances pb ON pb.potion_id = items.potion_id
+        ORDER BY items.potion_id
+        FOR UPDATE OF pb
+        """
+        rows = self._execute(reserve_sql, {"cart_id": cart_id}).fetchall()
+        if rows and rows[0].cart_potions == len(rows):
+            return rows
+
+        # some potion has no balance row (it has never been in stock), and
+        # FOR UPDATE can't take the nullable side of an outer join
+        locked = {row.potion_id: row.in_stock for row in rows}
+        items = self._execute("""
+            SELECT potion_id, SUM(quantity) AS quantity, SUM(cost) AS cost
+            FROM cart_items
+            WHERE cart_id = :cart_id
+            GROUP BY potion_id
+            ORDER BY potion_id
+        """, {"cart_id": cart_id}).fetchall()
+        return [
+            CartReservation(item.potion_id, item.quantity, locked.get(item.potion_id, 0), item.cost)
+            for item in items
+        ]
+
+    def take_cart_items(self, cart_id):
+        # every line out of inventory with a single insert
+        sql = """
+        INSERT INTO potion_ledger (potion_id, quantity_change)
+        SELECT potion_id, -SUM(quantity)
+        FROM cart_items
+        WHERE cart_id = :cart_id
+        GROUP BY potion_id
+        """
+        self._execute(sql, {"cart_id": cart_id})
+
+    def search_line_items(self, customer_name, potion_sku, sort_key, descending, after, limit):
+        sort_column = SEARCH_SORT_COLUMNS[sort_key]
+
+        # only filter on what was asked for so the trigram indexes can be used
+        conditions = []
+        params = {"limit": limit}
+        if customer_name:
+            conditions.append("cart.customer_name ILIKE :customer_name")
+            params["customer_name"] = f'%{customer_name}%'
+        if potion_sku:
+            conditions.append("ci.item_sku ILIKE :potion_sku")
+            params["potion_sku"] = f'%{potion_sku}%'
+        if after is not None:
+            comparison, params["sort_value"], params["last_id"] = after
+            conditions.append(f"({sort_column}, ci.id) {'<' if comparison == '<' else '>'} (:sort_value, :last_id)")
+
+        order = "DESC" if descending else "ASC"
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        sql = f"""
+        SELECT
+            ci.id,
+            cart.customer_name,
+            ci.item_sku,
+            ci.quantity,
+            ci.cart_id,
+            ci.cost AS line_item_total,
+            cart.created_at AS timestamp,
+            {sort_column} AS sort_value
+        FROM
+            cart_items ci
+        JOIN
+            carts cart ON ci.cart_id = cart.id
+        {where}
+        ORDER BY
+            {sort_column} {order}, ci.id {order}
+        LIMIT
+            :limit
+        """
+        return self._execute(sql, params).fetchall()
+
+    # processed deliveries
+
+    def claim_delivery(self, endpoint, order_id):
+        params = {"endpoint": endpoint, "order_id": order_id}
+        claimed = self._execute("""
+            INSERT INTO processed_deliveries (endpoint, order_id)
+            VALUES (:endpoint, :order_id)
+            ON CONFLICT DO NOTHING
+            RETURNING order_id
+        """, params).scalar()
+        if claimed is not None:
+            return True, None
+
+        # the conflicting row is committed by now, so its response is there
+        stored = self._execute("""
+            SELECT CAST(response AS text)
+            FROM processed_deliveries
+            WHERE endpoint = :endpoint AND order_id = :order_id
+        """, params).scalar()
+        return False, json.loads(stored) if stored is not None else None
+
+    def complete_delivery(self, endpoint, order_id, response):
+        self._execute("""
+            UPDATE processed_deliveries
+            SET response = CAST(:response AS jsonb)
+            WHERE endpoint = :endpoint AND order_id = :order_id
+        """, {"endpoint": endpoint, "order_id": order_id, "response": json.dumps(response)})
+
+    # visit rollups
+
+    def add_visits(self, rollups):
+        if not rollups:
+            return
+
+        sql = """
+        INSERT INTO visit_rollups (day, hour, character_class, level_band, visits)
+        SELECT * FROM unnest(
+            CAST(:days AS text[]), CAST(:hours AS int[]), CAST(:classes AS text[]),
+            CAST(:bands AS text[]), CAST(:visits AS int[])
+        )
+        ON CONFLICT (day, hour, character_class, level_band)
+        DO UPDATE SET visits = visit_rollups.visits + EXCLUDED.visits
+        """
+        days, hours, classes, bands, counts = (list(column) for column in zip(*rollups))
+        self._execute(sql, {"days": days, "hours": hours, "classes": classes, "bands": bands, "visits": counts})
+
+    # sales rollups
+
+    def add_sales(self, day, hour, sales):
+        if not sales:
+            return
+
+        sql = """
+        INSERT INTO sales_rollups (day, hour, potion_id, quantity, gold)
+        SELECT :day, :hour, * FROM unnest(
+            CAST(:potion_ids AS bigint[]), CAST(:quantities AS bigint[]), CAST(:gold AS bigint[])
+        )
+        ON CONFLICT (day, hour, potion_id)
+        DO UPDATE SET quantity = sales_rollups.quantity + EXCLUDED.quantity,
+                      gold = sales_rollups.gold + EXCLUDED.gold
+        """
+        potion_ids, quantities, gold = (list(column) for column in zip(*sales))
+        self._execute(sql, {"day": day, "hour": hour, "potion_ids": potion_ids, "quantities": quantities, "gold": gold})
+
+    def sales(self, day=None, hour=None):
+        # SUM over bigint is numeric, cast back so callers get ints, not Decimals
+        conditions = []
+        params = {}
+        if day is not None:
+            conditions.append("day = :day")
+            params["day"] = day
+        if hour is not None:
+            conditions.append("hour = :hour")
+            params["hour"] = hour
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        sql = f"""
+        SELECT potion_id, CAST(SUM(quantity) AS bigint) AS quantity, CAST(SUM(gold) AS bigint) AS gold
+        FROM sales_rollups
+        {where}
+        GROUP BY potion_id
+        ORDER BY potion_id
+        """
+        return self._execute(sql, params).fetchall()
+
+    # game time
+
+    def set_game_time(self, day, hour):
+        self._execute("UPDATE game_time SET day = :day, hour = :hour WHERE id = 1", {"day": day, "hour": hour})
+
+    def game_time(self):
+        return tuple(self._execute("SELECT day, hour FROM game_time WHERE id = 1").one())
+
+    # admin
+
+    def reset(self):
+        # clear ledgers
+        self._execute("TRUNCATE TABLE gold_ledger")
+        self._execute("TRUNCATE TABLE ml_ledger")
+        self._execute("TRUNCATE TABLE potion_ledger")
+        self._execute("TRUNCATE TABLE gold_ledger_archive, ml_ledger_archive, potion_ledger_archive")
+
+        # clear carts
+        self._execute("TRUNCATE TABLE cart_items")
+        self._execute("TRUNCATE TABLE carts CASCADE")
+
+        # a new game reuses order ids
+        self._execute("TRUNCATE TABLE processed_deliveries")
+        self._execute("TRUNCATE TABLE visit_rollups")
+        self._execute("TRUNCATE TABLE sales_rollups")
+        self.set_game_time("", -1)
+
+        # insert 100 gold
+        self.record_gold(100)
+
+    # transaction
+
+    def commit(self):
+        self.connection.commit()
+        if self.on_commit is not None:
+            self.on_commit()
+
+    def rollback(self):
+        self.connection.rollback()
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+
+# Streaming aggregate of customer visits, the demand signal for the planners.
+# /carts/visits/ hands each batch to ingest(), which only bumps in-memory
+# counters keyed by character class, level band and game hour (the hour comes
+# from /info/current_time). Memory stays bounded: classes past MAX_CLASSES
+# are counted as "other", levels are grouped into LEVEL_BAND_SIZE bands, and
+# only the last RECENT_TICKS game hours are kept tick by tick.
+#
+# Visits are also rolled up into visit_rollups, one upsert per flush instead
+# of a write per visit. A flush is due every VISIT_FLUSH_SECONDS and whenever
+# the game hour changes.
+#
+# Planners read through all_time(), by_hour() and recent().
+
+LEVEL_BAND_SIZE = 5
+MAX_LEVEL_BAND = 100
+MAX_CLASSES = 32
+RECENT_TICKS = int(os.environ.get("VISIT_RECENT_TICKS", 24))
+FLUSH_SECONDS = float(os.environ.get("VISIT_FLUSH_SECONDS", 60))
+
+_lock = threading.Lock()
+_game_time = (None, None)
+_classes = set()
+_totals = Counter()
+_recent = deque(maxlen=RECENT_TICKS)
+_pending = Counter()
+_last_flush = time.monotonic()
+
+
+def level_band(level):
+    """Label of the level band a level falls in, e.g. "6-10" or "100+"."""
+    if level >= MAX_LEVEL_BAND:
+        return f"{MAX_LEVEL_BAND}+"
+    low = max(level - 1, 0) // LEVEL_BAND_SIZE * LEVEL_BAND_SIZE + 1
+    return f"{low}-{low + LEVEL_BAND_SIZE - 1}"
+
+
+def set_time(day, hour):
+    """Record the current game time. Returns True if the hour changed, which makes a flush due."""
+    global _game_time
+    with _lock:
+        if _game_time == (day, hour):
+            return False
+        _game_time = (day, hour)
+        _recent.append((day, hour, Counter()))
+        return True
+
+
+def ingest(customers):
+    """Count a batch of visiting customers (objects with character_class and level)."""
+    with _lock:
+        day, hour = _game_time
+        if not _recent:
+            _recent.append((day, hour, Counter()))
+        tick = _recent[-1][2]
+        for customer in customers:
+            character_class = customer.character_class
+            if character_class not in _classes:
+                if len(_classes) >= MAX_CLASSES:
+                    character_class = "other"
+                else:
+                    _classes.add(character_class)
+            band = level_band(customer.level)
+            _totals[(character_class, band, hour)] += 1
+            tick[(character_class, band)] += 1
+            _pending[(day, hour, character_class, band)] += 1
+
+
+def flush_due():
+    with _lock:
+        return bool(_pending) and time.monotonic() - _last_flush >= FLUSH_SECONDS
+
+
+def flush(store):
+    """Add the visits counted since the last flush onto visit_rollups, in one write."""
+    global _pending, _last_flush
+    with _lock:
+        pending, _pending = _pending, Counter()
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+
+    try:
+        store.add_visits([
+            (day or "", -1 if hour is None else hour, character_class, band, count)
+            for (day, hour, character_class, band), count in pending.items()
+        ])
+    except Exception:
+        # keep the counts for the next flush
+        with _lock:
+            _pending.update(pending)
+        raise
+
+
+def game_time():
+    """The (day, hour) last reported by /info/current_time, or (None, None)."""
+    with _lock:
+        return _game_time
+
+
+def all_time():
+    """Visits since startup as {(character_class, level_band, hour): count}."""
+    with _lock:
+        return dict(_totals)
+
+
+def by_hour():
+    """Visits since startup per game hour, as {hour: count}."""
+    hours = Counter()
+    with _lock:
+        for (_, _, hour), count in _totals.items():
+            hours[hour] += count
+    return dict(hours)
+
+
+def recent(ticks=RECENT_TICKS):
+    """The last `ticks` game hours, oldest first, as [(day, hour, {(character_class, level_band): count})]."""
+    with _lock:
+        return [(day, hour, dict(counts)) for day, hour, counts in list(_recent)[-ticks:]]
+
+
+def reset():
+    """Forget everything counted so far, including visits not yet flushed."""
+    global _game_time
+    with _lock:
+        _game_time = (None, None)
+        _classes.clear()
+        _totals.clear()
+        _recent.clear()
+        _pending.clear()
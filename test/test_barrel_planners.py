@@ -0,0 +1,44 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from src.planners import barrels
+
+
+def barrel(sku, color, ml_per_barrel=500, price=50, quantity=20):
+    potion_type = [0, 0, 0, 0]
+    potion_type[barrels.COLORS.index(color)] = 1
+    return SimpleNamespace(sku=sku, ml_per_barrel=ml_per_barrel, potion_type=potion_type, price=price, quantity=quantity)
+
+
+CATALOG = [barrel(f"{color.upper()}_BARREL", color) for color in barrels.COLORS]
+EMPTY = dict.fromkeys(barrels.COLORS, 0)
+
+
+def ml_by_color(plan):
+    by_sku = {item.sku: item for item in CATALOG}
+    bought = dict.fromkeys(barrels.COLORS, 0)
+    for sku, quantity in plan:
+        bought[barrels.barrel_color(by_sku[sku])] += by_sku[sku].ml_per_barrel * quantity
+    return bought
+
+
+@pytest.mark.skipif("BARREL_PLANNER" in os.environ, reason="BARREL_PLANNER overrides the default")
+def test_knapsack_is_the_default():
+    assert barrels.DEFAULT_STRATEGY == barrels.Strategy.knapsack
+
+
+def test_knapsack_buys_toward_demand():
+    demand = {"red": 6, "green": 2, "blue": 1, "dark": 1}
+    plan = barrels.plan(barrels.Strategy.knapsack, CATALOG, 10000, EMPTY, 20000, demand)
+    bought = ml_by_color(plan)
+    assert bought["red"] > bought["green"] > bought["blue"]
+    assert sum(bought.values()) <= 20000
+
+
+def test_knapsack_stays_within_gold_and_quantity():
+    plan = barrels.plan(barrels.Strategy.knapsack, CATALOG, 420, EMPTY, 100000, None)
+    by_sku = {item.sku: item for item in CATALOG}
+    assert sum(by_sku[sku].price * quantity for sku, quantity in plan) <= 420
+    assert all(quantity <= by_sku[sku].quantity for sku, quantity in plan)
@@ -0,0 +1,51 @@
+import itertools
+import random
+
+import pytest
+
+from src.planners import bottling
+
+
+def random_recipe(rng):
+    cuts = sorted(rng.choice(range(0, 101, 25)) for _ in range(3))
+    return [cuts[0], cuts[1] - cuts[0], cuts[2] - cuts[1], 100 - cuts[2]]
+
+
+def best_count(inventory, recipes, max_potions):
+    """Most potions any plan can bottle, by brute force."""
+    recipe_list = list(recipes.values())
+    best = 0
+    for counts in itertools.product(range(max_potions + 1), repeat=len(recipe_list)):
+        total = sum(counts)
+        if total <= best or total > max_potions:
+            continue
+        if all(sum(recipe[i] * count for recipe, count in zip(recipe_list, counts)) <= inventory[i] for i in range(4)):
+            best = total
+    return best
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_greedy_plan_is_feasible_and_close_to_best(seed):
+    rng = random.Random(seed)
+    recipes = {potion_id: random_recipe(rng) for potion_id in range(3)}
+    inventory = [rng.randint(0, 400) for _ in range(4)]
+    max_potions = rng.randint(1, 6)
+
+    counts = bottling.plan_greedy(inventory, recipes, max_potions)
+
+    assert sum(counts.values()) <= max_potions
+    for i in range(4):
+        assert sum(recipes[potion_id][i] * count for potion_id, count in counts.items()) <= inventory[i]
+    # a heuristic: it may miss the best plan, but not by much
+    assert sum(counts.values()) >= best_count(inventory, recipes, max_potions) - 2
+
+
+def test_plan_dispatches_values_by_strategy():
+    inventory = [100, 100, 0, 0]
+    recipes = {1: [100, 0, 0, 0], 2: [0, 100, 0, 0], 3: [50, 50, 0, 0]}
+    prices = {1: 10, 2: 10, 3: 100}
+    sales_weights = {1: 50, 2: 1, 3: 1}
+
+    assert bottling.plan(bottling.Strategy.max_count, inventory, recipes, 5, prices, sales_weights) == {1: 1, 2: 1}
+    assert bottling.plan(bottling.Strategy.max_revenue, inventory, recipes, 5, prices, sales_weights) == {3: 2}
+    assert bottling.plan(bottling.Strategy.best_sellers, inventory, recipes, 5, prices, sales_weights)[1] == 1
@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from src import database as db
+from src import recipes
+from src.api import carts
+from src.storage.memory import MemoryDatabase, MemoryStore
+
+RED = 1
+STOCK = 10
+CARTS = 40
+WORKERS = 16
+
+
+@pytest.fixture
+def database():
+    recipes.invalidate()
+    yield MemoryDatabase()
+    recipes.invalidate()
+
+
+def fill_carts(database, quantity):
+    store = MemoryStore(database)
+    store.record_potions([(RED, STOCK)])
+    cart_ids = []
+    for i in range(CARTS):
+        cart_id = store.create_cart(f"customer {i}", "Rogue", 3, "2024-01-01T00:00:00")
+        store.add_cart_items(cart_id, [("RED_POTION", quantity, RED, quantity * 50)])
+        cart_ids.append(cart_id)
+    store.commit()
+    return cart_ids
+
+
+def checkout(database, cart_id):
+    store = MemoryStore(database)
+    try:
+        result = carts._checkout(store, cart_id, carts.CartCheckout(payment="test"))
+    except HTTPException as e:
+        store.rollback()
+        assert e.status_code == 409
+        return None
+    store.commit()
+    return result
+
+
+@pytest.mark.parametrize("quantity", [1, 3])
+def test_concurrent_checkouts_never_oversell(database, quantity):
+    cart_ids = fill_carts(database, quantity)
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(lambda cart_id: checkout(database, cart_id), cart_ids))
+
+    sold = [result for result in results if result is not None]
+    assert len(sold) == STOCK // quantity
+
+    store = MemoryStore(database)
+    balances = store.balances()
+    assert balances["potions"] == STOCK % quantity
+    assert balances["gold"] == 100 + len(sold) * quantity * 50
+    # the sales rollup counts exactly what was sold
+    assert [tuple(row) for row in store.sales()] == [(RED, len(sold) * quantity, len(sold) * quantity * 50)]
+    store.rollback()
+
+
+def test_checkout_of_empty_cart_is_not_found(database):
+    store = MemoryStore(database)
+    cart_id = store.create_cart("alice", "Rogue", 3, "2024-01-01T00:00:00")
+    with pytest.raises(HTTPException) as raised:
+        carts._checkout(store, cart_id, carts.CartCheckout(payment="test"))
+    assert raised.value.status_code == 404
+    store.rollback()
+
+
+def test_checkout_stamps_sales_with_the_stored_game_time(database):
+    cart_ids = fill_carts(database, 1)
+    store = MemoryStore(database)
+    store.set_game_time("Edgeday", 4)
+    store.commit()
+
+    checkout(database, cart_ids[0])
+
+    store = MemoryStore(database)
+    assert [tuple(row) for row in store.sales("Edgeday", 4)] == [(RED, 1, 50)]
+    store.rollback()
+
+
+def test_batch_checkout_commits_through_the_ledger_writer(database, monkeypatch):
+    monkeypatch.setattr(db, "memory_database", database)
+    store = MemoryStore(database)
+    store.record_potions([(RED, STOCK)])
+    store.commit()
+
+    batch = carts.CartBatch(
+        customer=carts.Customer(customer_name="alice", character_class="Rogue", level=3),
+        items=[carts.CartLine(sku="RED_POTION", quantity=2)],
+        checkout=carts.CartCheckout(payment="test"),
+    )
+    result = carts.create_cart_batch(batch)
+
+    assert result["total_potions_bought"] == 2
+    store = MemoryStore(database)
+    assert store.balances()["potions"] == STOCK - 2
+    store.rollback()
+
+
+@pytest.mark.parametrize("quantity", [0, -1])
+def test_batch_lines_need_a_positive_quantity(quantity):
+    with pytest.raises(ValidationError):
+        carts.CartLine(sku="RED_POTION", quantity=quantity)
+
+
+def test_set_item_quantity_reports_why_it_failed(database):
+    result = carts.set_item_quantity(1, "RED_POTION", carts.CartItem(quantity=1), store=MemoryStore(database))
+    assert result == {"success": False, "message": "Cart not found"}
+
+
+def test_checkout_charges_the_cost_stored_with_the_lines(database):
+    store = MemoryStore(database)
+    # priced at 30 when added, and since dropped from the catalog
+    store.record_potions([(99, 5)])
+    cart_id = store.create_cart("alice", "Rogue", 3, "2024-01-01T00:00:00")
+    store.add_cart_items(cart_id, [("OLD_POTION", 2, 99, 60), ("RED_POTION", 1, RED, 50)])
+    store.record_potions([(RED, 1)])
+    store.commit()
+
+    assert checkout(database, cart_id) == {"total_potions_bought": 3, "total_gold_paid": 110}
@@ -0,0 +1,149 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import sqlalchemy
+from fastapi import HTTPException
+
+from src import database as db
+from src import ledger_writer
+from src import migrate
+from src import recipes
+from src.api import carts
+
+# Checkouts and the ledger triggers against a real Postgres. Checkouts go
+# through ledger_writer.run like the checkout endpoint. Each test migrates a
+# throwaway schema on the database at POSTGRES_URI and drops it afterwards,
+# so the tables there are never touched.
+
+POSTGRES_URI = os.environ.get("POSTGRES_URI")
+pytestmark = pytest.mark.skipif(not POSTGRES_URI, reason="POSTGRES_URI is not set")
+
+WORKERS = 16
+CARTS = 64
+PRICE = 10
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    schema = f"checkout_test_{uuid.uuid4().hex[:12]}"
+    admin = sqlalchemy.create_engine(POSTGRES_URI)
+    with admin.begin() as connection:
+        connection.execute(sqlalchemy.text(f"CREATE SCHEMA {schema}"))
+
+    # public stays on the path for pg_trgm
+    engine = sqlalchemy.create_engine(
+        POSTGRES_URI,
+        pool_size=WORKERS,
+        max_overflow=0,
+        connect_args={"options": f"-csearch_path={schema},public"},
+    )
+    migrate.migrate(engine)
+    monkeypatch.setattr(db, "memory_database", None)
+    monkeypatch.setattr(db, "_engine", engine)
+    monkeypatch.setattr(ledger_writer, "MODE", "direct")
+    recipes.invalidate()
+    yield engine
+
+    recipes.invalidate()
+    engine.dispose()
+    with admin.begin() as connection:
+        connection.execute(sqlalchemy.text(f"DROP SCHEMA {schema} CASCADE"))
+    admin.dispose()
+
+
+def execute(engine, sql, params=None):
+    with engine.begin() as connection:
+        return connection.execute(sqlalchemy.text(sql), params).fetchall()
+
+
+def stock_potions(engine, count, stock):
+    """Add `count` potions with `stock` of each in inventory. Returns their (id, sku)."""
+    potions = []
+    for i in range(count):
+        sku = f"TEST_POTION_{i}"
+        potion_id = execute(engine, """
+            INSERT INTO potions (sku, name, price, red, green, blue, dark)
+            VALUES (:sku, :sku, :price, 100, 0, 0, 0)
+            RETURNING id
+        """, {"sku": sku, "price": PRICE})[0].id
+        execute(engine, "INSERT INTO potion_ledger (potion_id, quantity_change) VALUES (:id, :stock)",
+                {"id": potion_id, "stock": stock})
+        potions.append((potion_id, sku))
+    recipes.invalidate()
+    return potions
+
+
+def fill_carts(engine, potions):
+    """One cart with one unit per (potion_id, sku). Returns the cart ids."""
+    cart_ids = []
+    for i, (potion_id, sku) in enumerate(potions):
+        cart_id = execute(engine, """
+            INSERT INTO carts (customer_name, character_class, level) VALUES (:name, 'Rogue', 1) RETURNING id
+        """, {"name": f"customer {i}"})[0].id
+        execute(engine, """
+            INSERT INTO cart_items (cart_id, item_sku, quantity, potion_id, cost) VALUES (:cart_id, :sku, 1, :potion_id, :price)
+        """, {"cart_id": cart_id, "sku": sku, "potion_id": potion_id, "price": PRICE})
+        cart_ids.append(cart_id)
+    return cart_ids
+
+
+def checkout(cart_id):
+    try:
+        ledger_writer.run(carts._checkout, cart_id, carts.CartCheckout(payment="test"))
+        return True
+    except HTTPException as e:
+        assert e.status_code == 409
+        return False
+
+
+def checkout_all(cart_ids, workers):
+    """Check out every cart from `workers` threads. Returns (successful checkouts, seconds)."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(checkout, cart_ids))
+    return sum(results), time.perf_counter() - start
+
+
+def gold(engine):
+    return execute(engine, "SELECT gold FROM ledger_balances")[0].gold
+
+
+def test_concurrent_same_sku_checkouts_never_oversell(engine):
+    stock = CARTS // 2
+    [(potion_id, sku)] = stock_potions(engine, 1, stock)
+    cart_ids = fill_carts(engine, [(potion_id, sku)] * CARTS)
+    gold_before = gold(engine)
+
+    succeeded, _ = checkout_all(cart_ids, WORKERS)
+
+    assert succeeded == stock
+    assert execute(engine, "SELECT quantity FROM potion_balances WHERE potion_id = :id", {"id": potion_id})[0].quantity == 0
+    assert gold(engine) == gold_before + stock * PRICE
+    assert execute(engine, "SELECT CAST(SUM(quantity) AS bigint) AS quantity FROM sales_rollups")[0].quantity == stock
+
+
+def test_concurrent_different_sku_checkouts_beat_serial(engine):
+    potions = stock_potions(engine, CARTS, 2)
+    serial_carts = fill_carts(engine, potions)
+    concurrent_carts = fill_carts(engine, potions)
+    gold_before = gold(engine)
+
+    serial, serial_seconds = checkout_all(serial_carts, 1)
+    concurrent, concurrent_seconds = checkout_all(concurrent_carts, WORKERS)
+
+    assert serial == concurrent == CARTS
+    assert execute(engine, "SELECT COUNT(*) AS n FROM potion_balances WHERE quantity <> 0")[0].n == 0
+    assert gold(engine) == gold_before + 2 * CARTS * PRICE
+    # checkouts of different potions only share the ledger_balances row, and
+    # only for the gold insert and the commit
+    assert concurrent_seconds < serial_seconds
+
+
+def test_ledger_rows_cannot_be_updated(engine):
+    # an update would change the history without touching ledger_balances
+    with pytest.raises(sqlalchemy.exc.DBAPIError, match="append-only"):
+        execute(engine, "UPDATE gold_ledger SET quantity_change = 1000")
+    assert gold(engine) == execute(engine, "SELECT CAST(SUM(quantity_change) AS bigint) AS gold FROM gold_ledger")[0].gold
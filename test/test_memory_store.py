@@ -0,0 +1,169 @@
+import threading
+import time
+
+import pytest
+
+from src import idempotency
+from src import recipes
+from src.storage.memory import MemoryDatabase, MemoryStore
+
+
+@pytest.fixture
+def database():
+    recipes.invalidate()
+    yield MemoryDatabase()
+    recipes.invalidate()
+
+
+def committed(database, work):
+    store = MemoryStore(database)
+    result = work(store)
+    store.commit()
+    return result
+
+
+def test_new_shop_starts_with_100_gold(database):
+    balances = committed(database, lambda store: store.balances())
+    assert balances == {"gold": 100, "potions": 0, "ml": {"red": 0, "green": 0, "blue": 0, "dark": 0}}
+
+
+def test_commit_keeps_writes(database):
+    store = MemoryStore(database)
+    store.record_gold(-40)
+    store.record_ml({"red": 500, "dark": 100})
+    store.record_potions([(1, 3), (2, 2)])
+    store.commit()
+
+    balances = committed(database, lambda store: store.balances())
+    assert balances == {"gold": 60, "potions": 5, "ml": {"red": 500, "green": 0, "blue": 0, "dark": 100}}
+
+
+def test_rollback_undoes_every_write(database):
+    store = MemoryStore(database)
+    store.record_gold(-40)
+    store.record_ml({"green": 250})
+    store.record_potions([(1, 3)])
+    store.add_capacity(1, 2)
+    cart_id = store.create_cart("alice", "Rogue", 3, "2024-01-01T00:00:00")
+    store.add_cart_items(cart_id, [("RED_POTION", 2, 1, 100)])
+    store.claim_delivery("/bottler/deliver", 7)
+    store.add_visits([("Edgeday", 4, "Rogue", "1-5", 3)])
+    store.add_sales("Edgeday", 4, [(1, 2, 100)])
+    store.set_game_time("Edgeday", 4)
+    store.rollback()
+
+    store = MemoryStore(database)
+    assert store.balances() == {"gold": 100, "potions": 0, "ml": {"red": 0, "green": 0, "blue": 0, "dark": 0}}
+    assert store.capacity() == (1, 1)
+    assert not store.cart_exists(cart_id)
+    assert store.claim_delivery("/bottler/deliver", 7) == (True, None)
+    assert store.sales() == []
+    assert store.game_time() == ("", -1)
+    store.rollback()
+    assert not +database.visit_rollups
+
+
+def test_rollback_leaves_earlier_commits(database):
+    committed(database, lambda store: store.record_potions([(1, 5)]))
+    committed(database, lambda store: store.add_sales("Edgeday", 4, [(1, 1, 50)]))
+
+    store = MemoryStore(database)
+    store.record_potions([(1, -2)])
+    store.add_sales("Edgeday", 4, [(1, 2, 100), (2, 1, 50)])
+    store.rollback()
+
+    store = MemoryStore(database)
+    assert store.balances()["potions"] == 5
+    assert [tuple(row) for row in store.sales()] == [(1, 1, 50)]
+    store.rollback()
+
+
+def test_rollback_of_reset_restores_the_shop(database):
+    committed(database, lambda store: store.record_gold(900))
+    store = MemoryStore(database)
+    store.reset()
+    assert store.balances()["gold"] == 100
+    store.rollback()
+
+    assert committed(database, lambda store: store.balances())["gold"] == 1000
+
+
+def test_reserve_cart_reports_stock(database):
+    def fill_cart(store):
+        store.record_potions([(1, 3)])
+        cart_id = store.create_cart("alice", "Rogue", 3, "2024-01-01T00:00:00")
+        # potion 2 has never been in stock
+        store.add_cart_items(cart_id, [("GREEN_POTION", 1, 2, 50), ("RED_POTION", 2, 1, 100), ("RED_POTION", 2, 1, 100)])
+        return cart_id
+
+    cart_id = committed(database, fill_cart)
+    reservation = committed(database, lambda store: store.reserve_cart(cart_id))
+    assert [tuple(item) for item in reservation] == [(1, 4, 3, 200), (2, 1, 0, 50)]
+    assert committed(database, lambda store: store.reserve_cart(cart_id + 1)) == []
+
+
+def test_take_cart_items_sells_stock(database):
+    def fill_cart(store):
+        store.record_potions([(1, 5)])
+        cart_id = store.create_cart("alice", "Rogue", 3, "2024-01-01T00:00:00")
+        store.add_cart_items(cart_id, [("RED_POTION", 2, 1, 100)])
+        return cart_id
+
+    cart_id = committed(database, fill_cart)
+    committed(database, lambda store: store.take_cart_items(cart_id))
+    assert committed(database, lambda store: store.balances())["potions"] == 3
+
+
+def test_search_pages_in_order(database):
+    def fill_carts(store):
+        for name in ("carol", "alice", "bob"):
+            cart_id = store.create_cart(name, "Rogue", 3, "2024-01-01T00:00:00")
+            store.add_cart_items(cart_id, [("RED_POTION", 1, 1, 50)])
+
+    committed(database, fill_carts)
+    store = MemoryStore(database)
+    first = store.search_line_items("", "red", "customer_name", False, None, 2)
+    assert [item.customer_name for item in first] == ["alice", "bob"]
+    last = first[-1]
+    rest = store.search_line_items("", "red", "customer_name", False, (">", last.sort_value, last.id), 2)
+    assert [item.customer_name for item in rest] == ["carol"]
+    store.rollback()
+
+
+def test_cold_recipe_cache_does_not_deadlock_with_open_store(database):
+    # a handler holds the database lock and then asks the recipe cache, while
+    # another request fills the cold cache from a new store
+    holder = MemoryStore(database)
+    holder.cart_exists(1)
+
+    def fill_cache():
+        store = MemoryStore(database)
+        recipes.by_sku(store, "RED_POTION")
+        store.commit()
+
+    filler = threading.Thread(target=fill_cache, daemon=True)
+    filler.start()
+    time.sleep(0.1)
+
+    def ask_cache():
+        recipes.by_sku(holder, "GREEN_POTION")
+        holder.commit()
+
+    asker = threading.Thread(target=ask_cache, daemon=True)
+    asker.start()
+    asker.join(timeout=5)
+    filler.join(timeout=5)
+    assert not asker.is_alive() and not filler.is_alive(), "recipe cache and database lock deadlocked"
+
+
+def test_reset_lets_a_new_game_reuse_order_ids(database):
+    def deliver(store):
+        if idempotency.claim(store, "bottler", 7) is not None:
+            return "retry"
+        idempotency.complete(store, "bottler", 7, {"status": "success"})
+        return "applied"
+
+    assert committed(database, deliver) == "applied"
+    assert committed(database, deliver) == "retry"
+    committed(database, lambda store: store.reset())
+    assert committed(database, deliver) == "applied"
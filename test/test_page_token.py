@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.carts import decode_page_token, encode_page_token, search_sort_options
+
+
+@pytest.mark.parametrize("sort_col, sort_value", [
+    (search_sort_options.timestamp, datetime(2024, 5, 16, 12, 30, 5, 123456, tzinfo=timezone.utc)),
+    (search_sort_options.customer_name, "Zé, the \"potion\" fan"),
+    (search_sort_options.item_sku, "RED_POTION"),
+    (search_sort_options.line_item_total, 150),
+])
+@pytest.mark.parametrize("direction", ["next", "previous"])
+def test_page_token_round_trips(direction, sort_col, sort_value):
+    row = SimpleNamespace(id=42, sort_value=sort_value)
+    token = encode_page_token(direction, row, sort_col)
+    assert "=" not in token
+    assert decode_page_token(token, sort_col) == (direction, sort_value, 42)
+
+
+@pytest.mark.parametrize("token", [
+    "not a token",
+    "e30",  # {}
+    encode_page_token("sideways", SimpleNamespace(id=1, sort_value="RED_POTION"), search_sort_options.item_sku),
+    # valid, but for another sort column
+    encode_page_token("next", SimpleNamespace(id=1, sort_value="not a date"), search_sort_options.customer_name),
+])
+def test_bad_page_token_is_rejected(token):
+    with pytest.raises(HTTPException) as raised:
+        decode_page_token(token, search_sort_options.timestamp)
+    assert raised.value.status_code == 400
@@ -0,0 +1,110 @@
+import pytest
+
+from src import database as db
+
+
+class FakeConnection:
+    """Stands in for a SQLAlchemy connection; the replica's answers its lag query with `lag`."""
+
+    def __init__(self, name, lag=0.0):
+        self.name = name
+        self.lag = lag
+        self.lag_checks = 0
+        self.closed = False
+
+    def execute(self, statement, params=None):
+        self.lag_checks += 1
+        return self
+
+    def scalar(self):
+        return self.lag
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FakeEngine:
+    def __init__(self, connection=None, error=None):
+        self.connection = connection
+        self.error = error
+        self.connects = 0
+
+    def connect(self):
+        self.connects += 1
+        if self.error is not None:
+            raise self.error
+        return self.connection
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """A fresh replica with no lag, behind a fake primary, and clean routing state."""
+    connection = FakeConnection("replica")
+    engine = FakeEngine(connection)
+    monkeypatch.setattr(db, "memory_database", None)
+    monkeypatch.setattr(db, "READ_REPLICA_URI", "postgresql+psycopg2://replica/db")
+    monkeypatch.setattr(db, "REPLICA_MAX_LAG", 1.0)
+    monkeypatch.setattr(db, "REPLICA_CHECK_SECONDS", 0.0)
+    monkeypatch.setattr(db, "REPLICA_RETRY_SECONDS", 60.0)
+    monkeypatch.setattr(db, "_last_write", float("-inf"))
+    monkeypatch.setattr(db, "_replica", {"lag": 0.0, "checked_at": float("-inf"), "down_until": float("-inf")})
+    monkeypatch.setattr(db, "_replica_stats", dict.fromkeys(db._replica_stats, 0))
+    monkeypatch.setattr(db, "get_read_engine", lambda: engine)
+    monkeypatch.setattr(db, "get_engine", lambda: FakeEngine(FakeConnection("primary")))
+    return engine
+
+
+def read_from():
+    with db.read_session() as store:
+        return store.connection.name
+
+
+def test_fresh_replica_serves_reads(replica):
+    assert read_from() == "replica"
+    assert db._replica_stats["reads_replica"] == 1
+
+
+def test_lagging_replica_falls_back_to_primary(replica):
+    replica.connection.lag = 5.0
+    assert read_from() == "primary"
+    assert replica.connection.closed
+    assert db._replica_stats["replica_lag_seconds"] == 5.0
+
+    # once it catches up, reads go back to it
+    replica.connection.lag = 0.5
+    assert read_from() == "replica"
+
+
+def test_lag_is_checked_at_most_every_check_interval(replica, monkeypatch):
+    monkeypatch.setattr(db, "REPLICA_CHECK_SECONDS", 60.0)
+    read_from()
+    replica.connection.lag = 5.0
+    # the lag measured a moment ago still stands
+    assert read_from() == "replica"
+    assert replica.connection.lag_checks == 1
+
+
+def test_recent_write_reads_from_primary(replica):
+    db.note_write()
+    assert read_from() == "primary"
+    assert replica.connects == 0
+
+
+def test_failed_replica_is_skipped_until_retry(replica):
+    replica.error = OSError("connection refused")
+    assert read_from() == "primary"
+    assert read_from() == "primary"
+    assert replica.connects == 1
+    assert db._replica_stats["replica_fallbacks"] == 1
+
+
+def test_no_replica_configured_reads_from_primary(replica, monkeypatch):
+    monkeypatch.setattr(db, "READ_REPLICA_URI", None)
+    assert read_from() == "primary"
+    assert replica.connects == 0
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src import visits
+
+
+@pytest.fixture(autouse=True)
+def fresh_counts():
+    visits.reset()
+    yield
+    visits.reset()
+
+
+def customers(*levels, character_class="Rogue"):
+    return [SimpleNamespace(character_class=character_class, level=level) for level in levels]
+
+
+def test_visits_are_counted_by_class_band_and_hour():
+    visits.set_time("Edgeday", 4)
+    visits.ingest(customers(1, 3, 7))
+    visits.set_time("Edgeday", 6)
+    visits.ingest(customers(12, character_class="Wizard"))
+
+    assert visits.all_time() == {("Rogue", "1-5", 4): 2, ("Rogue", "6-10", 4): 1, ("Wizard", "11-15", 6): 1}
+    assert visits.by_hour() == {4: 3, 6: 1}
+    assert visits.recent() == [
+        ("Edgeday", 4, {("Rogue", "1-5"): 2, ("Rogue", "6-10"): 1}),
+        ("Edgeday", 6, {("Wizard", "11-15"): 1}),
+    ]
+
+
+def test_only_the_last_ticks_are_kept():
+    for hour in range(visits.RECENT_TICKS + 5):
+        visits.set_time("Edgeday", hour)
+        visits.ingest(customers(1))
+
+    recent = visits.recent()
+    assert len(recent) == visits.RECENT_TICKS
+    assert recent[0][1] == 5
+    assert [hour for _, hour, _ in visits.recent(2)] == [visits.RECENT_TICKS + 3, visits.RECENT_TICKS + 4]
+    # totals still cover every hour
+    assert sum(visits.by_hour().values()) == visits.RECENT_TICKS + 5
+
+
+def test_reset_forgets_every_count():
+    visits.set_time("Edgeday", 4)
+    visits.ingest(customers(1))
+    visits.reset()
+    assert visits.all_time() == {}
+    assert visits.recent() == []